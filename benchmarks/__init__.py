@@ -0,0 +1 @@
+"""Salve's benchmark suite, run it with `python3 -m benchmarks --help` to see the options"""
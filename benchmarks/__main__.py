@@ -0,0 +1,95 @@
+from argparse import ArgumentParser
+from importlib.metadata import PackageNotFoundError, version
+from json import dumps
+from platform import platform, python_version
+
+from beartype.typing import Any
+
+from salve import BEARTYPE_ENABLED
+
+from .corpora import LANGUAGES, generate_source
+from .suite import run_function_benchmarks, run_ipc_benchmarks
+
+
+def package_version(package: str) -> str:
+    try:
+        return version(package)
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        prog="python3 -m benchmarks",
+        description="Times every salve command on synthetic source files and outputs the results as JSON",
+    )
+    parser.add_argument(
+        "--languages", nargs="+", choices=LANGUAGES, default=LANGUAGES
+    )
+    parser.add_argument(
+        "--lines",
+        nargs="+",
+        type=int,
+        default=[1_000, 10_000],
+        help="sizes of the generated source files in lines",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="times each benchmark is run"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="seed for the generated files"
+    )
+    parser.add_argument(
+        "--skip-ipc",
+        action="store_true",
+        help="only time the server functions directly",
+    )
+    parser.add_argument(
+        "--output", help="file to write the results to instead of stdout"
+    )
+    args = parser.parse_args()
+
+    results: list[dict[str, Any]] = []
+    for language in args.languages:
+        for line_count in args.lines:
+            source: str = generate_source(language, line_count, args.seed)
+            suite_results: list[dict[str, Any]] = run_function_benchmarks(
+                source, language, args.repeat
+            )
+
+            if not args.skip_ipc:
+                suite_results.extend(
+                    run_ipc_benchmarks(source, language, args.repeat)
+                )
+
+            for result in suite_results:
+                results.append(
+                    {"language": language, "lines": line_count, **result}
+                )
+
+    output: str = dumps(
+        {
+            "metadata": {
+                "salve": package_version("salve"),
+                "pygments": package_version("pygments"),
+                "beartype": BEARTYPE_ENABLED,
+                "python": python_version(),
+                "platform": platform(),
+                "repeat": args.repeat,
+                "seed": args.seed,
+            },
+            "results": results,
+        },
+        indent=4,
+    )
+
+    if args.output is None:
+        print(output)
+        return
+
+    with open(args.output, "w") as file:
+        file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Synthetic source files for the benchmarks that look enough like real code to exercise every command"""
+
+from keyword import kwlist
+from random import Random
+
+LANGUAGES: list[str] = ["python", "javascript"]
+
+KEYWORDS: dict[str, list[str]] = {
+    "python": kwlist,
+    "javascript": [
+        "async",
+        "await",
+        "break",
+        "class",
+        "const",
+        "continue",
+        "else",
+        "export",
+        "for",
+        "function",
+        "if",
+        "import",
+        "let",
+        "new",
+        "return",
+        "this",
+        "while",
+    ],
+}
+
+DEFINITION_STARTERS: dict[str, list[tuple[str, str]]] = {
+    "python": [
+        (r"def ", "after"),
+        (r"import .*,? ", "after"),
+        (r"from ", "after"),
+        (r"class ", "after"),
+        (r":?.*=.*", "before"),
+    ],
+    "javascript": [
+        (r"function ", "after"),
+        (r"class ", "after"),
+        (r"(const|let|var) ", "after"),
+    ],
+}
+
+_SYLLABLES: list[str] = [
+    "al", "be", "co", "da", "el", "fi", "go", "ha", "in", "jo", "ka", "lu",
+    "me", "no", "or", "pa", "qu", "re", "si", "ta", "un", "ve", "wo", "xi",
+]  # fmt: skip
+
+
+def _identifier(rng: Random) -> str:
+    syllables: list[str] = rng.choices(_SYLLABLES, k=rng.randint(1, 4))
+    return "_".join(syllables) if rng.random() < 0.3 else "".join(syllables)
+
+
+def _python_block(rng: Random, names: list[str]) -> list[str]:
+    name: str = rng.choice(names)
+    other: str = rng.choice(names)
+    kind: float = rng.random()
+
+    if kind < 0.15:
+        return [
+            f"class {name.capitalize()}({other.capitalize()}):",
+            '    """',
+            f"    Handles {other} for https://example.com/{name}",
+            '    """',
+            "",
+            f"    def __init__(self, {other}: int = {rng.randint(0, 99)}):",
+            f"        self.{other} = {other}  # store {other}",
+            "",
+        ]
+
+    if kind < 0.5:
+        return [
+            f"def {name}({other}, *args):",
+            f'    """Returns the {other} of {name}"""',
+            f"    if {other} > {rng.randint(0, 999)}:",
+            f"        return {other} * {rng.random():.3f}",
+            f'    print("{name}\u200b{other}", args)',
+            f"    return {rng.choice(names)}({other} - 1)",
+            "",
+        ]
+
+    if kind < 0.6:
+        return [f"from {name} import {other}, {rng.choice(names)}", ""]
+
+    return [
+        f"{name} = [{other} for {other} in range({rng.randint(1, 50)})]",
+        f"# TODO: {rng.choice(names)} see http://docs.example.org/{other}",
+    ]
+
+
+def _javascript_block(rng: Random, names: list[str]) -> list[str]:
+    name: str = rng.choice(names)
+    other: str = rng.choice(names)
+    kind: float = rng.random()
+
+    if kind < 0.15:
+        return [
+            "/*",
+            f" * Handles {other} for https://example.com/{name}",
+            " */",
+            f"class {name.capitalize()} extends {other.capitalize()} {{",
+            f"    constructor({other}) {{ this.{other} = {other}; }}",
+            "}",
+            "",
+        ]
+
+    if kind < 0.5:
+        return [
+            f"function {name}({other}, ...args) {{",
+            f"    if ({other} > {rng.randint(0, 999)}) {{",
+            f"        return {other} * {rng.random():.3f};",
+            "    }",
+            f'    console.log("{name}\u200b{other}", args);',
+            f"    return {rng.choice(names)}({other} - 1);",
+            "}",
+            "",
+        ]
+
+    return [
+        f"const {name} = [1, 2, 3].map(({other}) => {other} * 2);",
+        f"// TODO: {rng.choice(names)} see http://docs.example.org/{other}",
+    ]
+
+
+def generate_source(language: str, line_count: int, seed: int = 0) -> str:
+    """Generates roughly line_count lines of source code in the given language"""
+    if language not in LANGUAGES:
+        raise Exception(f"Language {language} not in {LANGUAGES}!")
+
+    rng = Random(seed)
+
+    # Bigger files have more distinct identifiers just like real code
+    names: list[str] = [
+        _identifier(rng) for _ in range(max(line_count // 10, 20))
+    ]
+    make_block = _python_block if language == "python" else _javascript_block
+
+    lines: list[str] = []
+    while len(lines) < line_count:
+        lines.extend(make_block(rng, names))
+
+    return "\n".join(lines[:line_count]) + "\n"
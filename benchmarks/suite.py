@@ -0,0 +1,308 @@
+"""Times every salve server function directly and through round trips to the IPC server"""
+
+from statistics import mean, median
+from time import perf_counter, sleep
+
+from beartype.typing import Any, Callable
+
+from salve import (
+    AUTOCOMPLETE,
+    DEFINITION,
+    EDITORCONFIG,
+    HIGHLIGHT,
+    IPC,
+    LINKS_AND_CHARS,
+    REPLACEMENTS,
+)
+from salve.server_functions import (
+    DefinitionIndex,
+    WordIndex,
+    find_autocompletions,
+    get_definition,
+    get_highlights,
+    get_replacements,
+    get_special_tokens,
+)
+from salve.server_functions.definitions import definition_regexes
+from salve.server_functions.editorconfig import (
+    parse_editorconfig_cached,
+    resolve_config_cached,
+)
+from salve.server_functions.highlight.docstring_highlight import (
+    comment_scan_cached,
+)
+from salve.server_functions.highlight.highlight import lex_line_cached
+from salve.server_functions.links_and_hidden_chars import (
+    special_tokens_in_line,
+)
+
+from .corpora import DEFINITION_STARTERS, KEYWORDS
+
+# How many lines an editor typically shows at once
+VIEWPORT_LINES: int = 50
+
+
+def clear_caches() -> None:
+    """Clears every cache salve keeps between calls so the next call starts cold"""
+    lex_line_cached.cache_clear()
+    comment_scan_cached.cache_clear()
+    special_tokens_in_line.cache_clear()
+    definition_regexes.cache_clear()
+    parse_editorconfig_cached.cache_clear()
+    resolve_config_cached.cache_clear()
+
+
+def time_calls(
+    func: Callable[[], Any],
+    repeat: int,
+    setup: Callable[[], Any] = lambda: None,
+) -> dict[str, float]:
+    """Calls func repeat times (running setup untimed before each call) and summarizes the times in seconds"""
+    times: list[float] = []
+
+    for _ in range(repeat):
+        setup()
+        start: float = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+
+    return {
+        "min": min(times),
+        "median": median(times),
+        "mean": mean(times),
+        "max": max(times),
+    }
+
+
+def pick_words(source: str) -> tuple[str, str, str]:
+    """Picks a prefix to autocomplete, a misspelled word to replace, and a word to find the definition of"""
+    word_index = WordIndex(source)
+    common_word: str = max(
+        (word for word in word_index.word_counts if len(word) > 4),
+        key=word_index.count,
+    )
+    misspelled_word: str = common_word[:-2] + common_word[-1]
+
+    return (common_word[:2], misspelled_word, common_word)
+
+
+def run_function_benchmarks(
+    source: str, language: str, repeat: int
+) -> list[dict[str, Any]]:
+    """Times the server functions directly, once with nothing cached and once with indexes and caches already built"""
+    keywords: list[str] = KEYWORDS[language]
+    starters: list[tuple[str, str]] = DEFINITION_STARTERS[language]
+    prefix, misspelled_word, defined_word = pick_words(source)
+
+    line_count: int = len(source.splitlines())
+    middle: int = line_count // 2
+    viewport: tuple[int, int] = (middle, middle + VIEWPORT_LINES - 1)
+    whole_file: tuple[int, int] = (1, line_count)
+
+    word_index = WordIndex(source)
+    definition_index = DefinitionIndex(source)
+
+    cases: list[tuple[str, str, Callable[[], Any], Callable[[], Any]]] = [
+        (
+            "find_autocompletions",
+            "",
+            lambda: find_autocompletions(source, keywords, prefix),
+            lambda: find_autocompletions(source, keywords, prefix, word_index),
+        ),
+        (
+            "get_replacements",
+            "",
+            lambda: get_replacements(source, keywords, misspelled_word),
+            lambda: (
+                word_index.close_matches.clear(),
+                get_replacements(
+                    source, keywords, misspelled_word, word_index
+                ),
+            ),
+        ),
+        (
+            "get_definition",
+            "",
+            lambda: get_definition(source, starters, defined_word),
+            lambda: (
+                definition_index.definitions.clear(),
+                get_definition(
+                    source, starters, defined_word, definition_index
+                ),
+            ),
+        ),
+    ]
+
+    for variant, text_range in (("viewport", viewport), ("full", whole_file)):
+        cases.append(
+            (
+                "get_highlights",
+                variant,
+                lambda text_range=text_range: get_highlights(
+                    source, language, text_range
+                ),
+                lambda text_range=text_range: get_highlights(
+                    source, language, text_range
+                ),
+            )
+        )
+        cases.append(
+            (
+                "get_special_tokens",
+                variant,
+                lambda text_range=text_range: get_special_tokens(
+                    source, text_range
+                ),
+                lambda text_range=text_range: get_special_tokens(
+                    source, text_range
+                ),
+            )
+        )
+
+    results: list[dict[str, Any]] = []
+    for name, variant, cold_call, warm_call in cases:
+        results.append(
+            {
+                "benchmark": name,
+                "variant": variant,
+                "cache": "cold",
+                **time_calls(cold_call, repeat, clear_caches),
+            }
+        )
+
+        warm_call()  # Fills up the caches
+        results.append(
+            {
+                "benchmark": name,
+                "variant": variant,
+                "cache": "warm",
+                **time_calls(warm_call, repeat),
+            }
+        )
+
+    return results
+
+
+def wait_for_response(context: IPC, command: str, timeout: float = 30) -> Any:
+    start: float = perf_counter()
+    while (response := context.get_response(command)) is None:
+        if perf_counter() - start > timeout:
+            raise Exception(f"No response to {command} in {timeout} seconds!")
+        sleep(0.0001)
+
+    return response
+
+
+def run_ipc_benchmarks(
+    source: str, language: str, repeat: int
+) -> list[dict[str, Any]]:
+    """Times full round trips through the IPC from the request to the response being available"""
+    keywords: list[str] = KEYWORDS[language]
+    prefix, misspelled_word, defined_word = pick_words(source)
+    line_count: int = len(source.splitlines())
+    middle: int = line_count // 2
+    viewport: tuple[int, int] = (middle, middle + VIEWPORT_LINES - 1)
+
+    context = IPC()
+    context.update_file("benchmark", source)
+
+    requests: list[tuple[str, str, dict[str, Any]]] = [
+        (AUTOCOMPLETE, "", {"current_word": prefix}),
+        (REPLACEMENTS, "", {"current_word": misspelled_word}),
+        (
+            DEFINITION,
+            "",
+            {
+                "current_word": defined_word,
+                "definition_starters": DEFINITION_STARTERS[language],
+            },
+        ),
+        (HIGHLIGHT, "viewport", {"text_range": viewport}),
+        (HIGHLIGHT, "full", {"text_range": (1, -1)}),
+        (LINKS_AND_CHARS, "viewport", {"text_range": viewport}),
+        (EDITORCONFIG, "", {"file_path": __file__}),
+    ]
+
+    blank_line: list[bool] = [False]
+
+    def edit_file() -> None:
+        """Adds or takes away a blank line at the start of the file so the next request is for a new version"""
+        if blank_line[0]:
+            context.edit_file("benchmark", (1, 0), (2, 0), "")
+        else:
+            context.edit_file("benchmark", (1, 0), (1, 0), "\n")
+        blank_line[0] = not blank_line[0]
+
+    results: list[dict[str, Any]] = []
+    for command, variant, kwargs in requests:
+        file: str = "" if command == EDITORCONFIG else "benchmark"
+
+        def round_trip() -> None:
+            context.request(
+                command,
+                file=file,
+                expected_keywords=keywords,
+                language=language,
+                **kwargs,
+            )
+            wait_for_response(context, command)
+
+        round_trip()  # The first request also waits for the server to start
+
+        # Asking again for the same version is answered from the server's ResultCache while
+        # an edit before each request means the result has to be worked out again
+        results.append(
+            {
+                "benchmark": f"ipc_{command}",
+                "variant": variant,
+                # EDITORCONFIG results aren't kept by the ResultCache, only its own caches
+                "cache": "warm" if command == EDITORCONFIG else "hit",
+                **time_calls(round_trip, repeat),
+            }
+        )
+        if command != EDITORCONFIG:
+            results.append(
+                {
+                    "benchmark": f"ipc_{command}",
+                    "variant": variant,
+                    "cache": "miss",
+                    **time_calls(round_trip, repeat, edit_file),
+                }
+            )
+
+    # Sending a whole file versus sending an edit to it before autocompleting
+    def update_and_autocomplete() -> None:
+        context.update_file("benchmark", source + "\n")
+        context.request(
+            AUTOCOMPLETE,
+            file="benchmark",
+            expected_keywords=keywords,
+            current_word=prefix,
+        )
+        wait_for_response(context, AUTOCOMPLETE)
+
+    def edit_and_autocomplete() -> None:
+        context.edit_file("benchmark", (1, 0), (1, 0), prefix)
+        context.request(
+            AUTOCOMPLETE,
+            file="benchmark",
+            expected_keywords=keywords,
+            current_word=prefix,
+        )
+        wait_for_response(context, AUTOCOMPLETE)
+
+    for variant, func in (
+        ("update_file", update_and_autocomplete),
+        ("edit_file", edit_and_autocomplete),
+    ):
+        results.append(
+            {
+                "benchmark": f"ipc_{AUTOCOMPLETE}",
+                "variant": variant,
+                "cache": "miss",
+                **time_calls(func, repeat),
+            }
+        )
+
+    context.kill_IPC()
+    return results
@@ -1,6 +1,12 @@
-from beartype.claw import beartype_this_package
+from os import environ
 
-beartype_this_package()
+# Runtime type checking is great for development but costs time on every call so it can be turned off
+BEARTYPE_ENABLED: bool = environ.get("SALVE_DISABLE_BEARTYPE", "") in ("", "0")
+
+if BEARTYPE_ENABLED:
+    from beartype.claw import beartype_this_package
+
+    beartype_this_package()
 
 from collegamento import Response  # noqa: F401, E402
 
@@ -8,10 +14,24 @@ from .ipc import IPC  # noqa: F401, E402
 from .misc import (  # noqa: F401, E402
     AUTOCOMPLETE,
     COMMANDS,
+    DEFAULT_PRIORITIES,
+    DEFAULT_WORKERS,
     DEFINITION,
     EDITORCONFIG,
     HIGHLIGHT,
+    INDEXED_COMMANDS,
     LINKS_AND_CHARS,
+    PROCESS,
     REPLACEMENTS,
+    THREAD,
+)
+from .server_functions import (  # noqa: F401, E402
+    find_words,
+    is_unicode_letter,
+    iter_words,
+)
+from .token_encoding import (  # noqa: F401, E402
+    TOKEN_TYPES,
+    apply_token_diff,
+    decode_tokens,
 )
-from .server_functions import is_unicode_letter  # noqa: F401, E402
@@ -0,0 +1,136 @@
+from array import array
+from importlib.metadata import PackageNotFoundError, version
+from marshal import dumps, loads
+from mmap import ACCESS_READ, mmap
+from os import getpid, replace, utime
+from pathlib import Path
+from sys import version_info
+from threading import get_ident
+from urllib.parse import quote
+
+from beartype.typing import Any
+from pygments import __version__ as pygments_version
+from token_tools import Token
+
+from .token_encoding import encode_tokens
+
+# Bump this whenever what gets saved (or how it's worked out) changes
+CACHE_FORMAT: int = 1
+
+
+def salve_version() -> str:
+    try:
+        return version("salve")
+    except PackageNotFoundError:
+        # Running from a checkout instead of an install
+        return "source"
+
+
+class DiskCache:
+    """Saves per-file results in a directory so a new server can load them instead of working them out again.
+    Results are found by a hash of the file's contents (and the language) in a folder for this salve, pygments
+    and python version so results from an older version are never loaded"""
+
+    def __init__(self, directory: Path | str, max_files: int = 2000) -> None:
+        self.directory: Path = Path(directory) / (
+            f"salve-{salve_version()}-pygments-{pygments_version}"
+            f"-python-{version_info[0]}.{version_info[1]}-format-{CACHE_FORMAT}"
+        )
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # The least recently used files are deleted once there are more than max_files (checked every so many saves)
+        self.max_files: int = max_files
+        self.saves: int = 0
+
+    def path(self, content_hash: str, kind: str, language: str) -> Path:
+        return (
+            self.directory
+            / f"{content_hash}-{kind}-{quote(language, safe='')}"
+        )
+
+    def load_tokens(self, content_hash: str, language: str) -> array | None:
+        """Returns the saved Token's (as given by encode_tokens()) for the file and language if there are any"""
+        path: Path = self.path(content_hash, "tokens", language)
+        try:
+            with (
+                open(path, "rb") as file,
+                mmap(file.fileno(), 0, access=ACCESS_READ) as mapped,
+            ):
+                # The first byte is the typecode and the rest is copied straight from the mapping into the array
+                tokens: array = array(chr(mapped[0]))
+                with memoryview(mapped) as view:
+                    tokens.frombytes(view[1:])
+        except (OSError, ValueError):
+            # Nothing was saved (or the file is broken) so it just gets worked out again
+            return None
+
+        self.mark_used(path)
+        return tokens
+
+    def save_tokens(
+        self, content_hash: str, language: str, tokens: list[Token]
+    ) -> None:
+        encoded: array = encode_tokens(tokens)
+        self.write(
+            self.path(content_hash, "tokens", language),
+            encoded.typecode.encode() + encoded.tobytes(),
+        )
+
+    def load_value(
+        self, content_hash: str, kind: str, language: str = ""
+    ) -> Any | None:
+        """Returns a saved value (only builtin types like dict's of word counts or Token's) if there is one"""
+        path: Path = self.path(content_hash, kind, language)
+        try:
+            with (
+                open(path, "rb") as file,
+                mmap(file.fileno(), 0, access=ACCESS_READ) as mapped,
+            ):
+                value: Any = loads(mapped)
+        except (OSError, ValueError, EOFError, TypeError):
+            return None
+
+        self.mark_used(path)
+        return value
+
+    def save_value(
+        self, content_hash: str, kind: str, value: Any, language: str = ""
+    ) -> None:
+        self.write(self.path(content_hash, kind, language), dumps(value))
+
+    def write(self, path: Path, data: bytes) -> None:
+        """Writes to a temporary file first so other servers never see a half written file"""
+        temporary_path: Path = path.with_name(
+            f"{path.name}.{getpid()}-{get_ident()}.tmp"
+        )
+        try:
+            temporary_path.write_bytes(data)
+            replace(temporary_path, path)
+        except OSError:
+            # The cache is only there to make things faster so not being able to save isn't an error
+            temporary_path.unlink(missing_ok=True)
+            return
+
+        self.saves += 1
+        if self.saves % 100 == 0:
+            self.remove_old_files()
+
+    def mark_used(self, path: Path) -> None:
+        """Sets the modification time of a file to now so files are deleted by when they were last used"""
+        try:
+            utime(path)
+        except OSError:
+            # Another server may have just deleted it
+            pass
+
+    def remove_old_files(self) -> None:
+        """Deletes the least recently used (saved or loaded) files until there are at most max_files"""
+        try:
+            files: list[Path] = sorted(
+                self.directory.iterdir(), key=lambda file: file.stat().st_mtime
+            )
+            for file in files[: max(len(files) - self.max_files, 0)]:
+                file.unlink(missing_ok=True)
+        except OSError:
+            # Another server is probably cleaning up at the same time
+            pass
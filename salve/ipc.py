@@ -1,17 +1,33 @@
+from array import array
+from asyncio import AbstractEventLoop, Future, get_running_loop, sleep
+from functools import partial
+from multiprocessing import Process, Queue
 from pathlib import Path
+from time import time
 
-from collegamento import FileClient
+from beartype.typing import Any, Callable
+from collegamento import FileClient, Request, RequestQueueType, Response
+from token_tools import Token
 
 from .misc import (
     AUTOCOMPLETE,
     COMMAND,
     COMMANDS,
+    DEFAULT_PRIORITIES,
+    DEFAULT_WORKERS,
     DEFINITION,
     EDITORCONFIG,
     HIGHLIGHT,
+    INDEXED_COMMANDS,
     LINKS_AND_CHARS,
+    PROCESS,
     REPLACEMENTS,
+    THREAD,
+    WORKER,
+    apply_edit,
 )
+from .server import SalveServer
+from .token_encoding import decode_tokens, encode_tokens
 from .wrappers import (
     editorconfig_request_wrapper,
     find_autocompletions_request_wrapper,
@@ -25,12 +41,74 @@ from .wrappers import (
 class IPC(FileClient):
     """The IPC class is used to talk to the server and run commands. The public API includes the following methods:
     - IPC.request()
+    - IPC.request_async()
+    - IPC.add_callback()
     - IPC.update_file()
+    - IPC.edit_file()
     - IPC.remove_file()
     - IPC.kill_IPC()
     """
 
-    def __init__(self, id_max: int = 15000) -> None:
+    def __init__(
+        self,
+        id_max: int = 15000,
+        workers: dict[COMMAND, tuple[WORKER, int]] = DEFAULT_WORKERS,
+        cache_dir: Path | str | None = None,
+    ) -> None:
+        # Process workers are extra servers that share our response queue but have their own request queue
+        self.worker_servers: dict[
+            COMMAND, list[tuple[RequestQueueType, Process]]
+        ] = {}
+
+        for command, (worker, count) in workers.items():
+            if command not in COMMANDS:
+                raise Exception(
+                    f"Command {command} not in builtin commands. Those are {COMMANDS}!"
+                )
+
+            if worker not in (THREAD, PROCESS):
+                raise Exception(
+                    f"Worker {worker} for {command} is not {THREAD} or {PROCESS}!"
+                )
+
+            if worker == THREAD and command in INDEXED_COMMANDS:
+                raise Exception(
+                    f"Command {command} uses the server's indexes so it can only have {PROCESS} workers!"
+                )
+
+            if count < 1:
+                raise Exception(
+                    f"Command {command} needs at least one worker, not {count}!"
+                )
+
+        self.thread_workers: dict[COMMAND, int] = {
+            command: count
+            for command, (worker, count) in workers.items()
+            if worker == THREAD
+        }
+        self.process_workers: dict[COMMAND, int] = {
+            command: count
+            for command, (worker, count) in workers.items()
+            if worker == PROCESS
+        }
+
+        # Where the servers save results so the next IPC can load them instead of working them out again
+        self.cache_dir: str | None = (
+            None if cache_dir is None else str(cache_dir)
+        )
+
+        self.file_versions: dict[str, int] = {}
+        # The id of the newest request for each command so get_response() can give its response
+        self.newest_request_ids: dict[str, int] = {}
+        self.callbacks: dict[int, Callable[[Response], Any]] = {}
+
+        # How many results every server gave from (or had to add to) its ResultCache
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
+
+        # The event loop that gets woken up when responses come in (see IPC.request_async())
+        self.event_loop: AbstractEventLoop | None = None
+
         super().__init__(
             id_max=id_max,
             commands={
@@ -43,6 +121,217 @@ class IPC(FileClient):
             },
         )
 
+    def create_server(self) -> None:
+        """Creates the SalveServer and any process workers through subprocesses - internal API"""
+
+        # The FileClient always asks for a plain FileServer so we swap in our own here
+        self.server_type = partial(
+            SalveServer,
+            thread_workers=self.thread_workers,
+            cache_dir=self.cache_dir,
+        )
+
+        # The new server comes with a new response queue so the event loop has to watch that one instead
+        self.stop_watching_responses()
+        self.stop_workers()
+        super().create_server()
+
+        for command, count in self.process_workers.items():
+            self.worker_servers[command] = []
+            for index in range(count):
+                self.start_worker(command, index)
+
+        self.watch_responses()
+
+    def start_worker(self, command: COMMAND, index: int) -> None:
+        """Starts (or restarts) a process worker and gives it every file - internal API"""
+        request_queue: RequestQueueType = Queue()
+        process: Process = Process(
+            target=SalveServer,
+            args=(self.commands, request_queue, self.response_queue),
+            kwargs={"cache_dir": self.cache_dir},
+            daemon=True,
+        )
+        process.start()
+
+        workers: list[tuple[RequestQueueType, Process]] = self.worker_servers[
+            command
+        ]
+        if index < len(workers):
+            workers[index] = (request_queue, process)
+        else:
+            workers.append((request_queue, process))
+
+        for file, contents in self.files.items():
+            self.send_request(
+                (command, index),
+                "FileNotification",
+                file=file,
+                remove=False,
+                contents=contents,
+                version=self.file_versions[file],
+            )
+
+    def stop_workers(self) -> None:
+        """Terminates every process worker - internal API"""
+        for workers in self.worker_servers.values():
+            for _, process in workers:
+                process.terminate()
+
+        self.worker_servers = {}
+
+    def send_request(
+        self, server: tuple[COMMAND, int] | None, command: str, **kwargs
+    ) -> int:
+        """Sends a request to the main server or the process worker given by command and index - internal API"""
+        # Making the id can restart the servers so we only pick the queue after
+        id: int = self.create_message_id()
+
+        request_queue: RequestQueueType = self.request_queue
+        if server is not None:
+            if not self.worker_servers[server[0]][server[1]][1].is_alive():
+                self.start_worker(*server)
+
+            request_queue = self.worker_servers[server[0]][server[1]][0]
+
+        final_request: Request = {
+            "id": id,
+            "type": "request",
+            "command": command,
+        }
+        final_request.update(**kwargs)
+
+        if self.commands[command][1]:
+            self.current_ids[id] = command
+
+        self.current_ids[command] = id
+        self.newest_request_ids[command] = id
+
+        request_queue.put(final_request)
+        return id
+
+    def notify_servers(self, **kwargs) -> None:
+        """Sends a FileNotification to the main server and every process worker - internal API"""
+        self.send_request(None, "FileNotification", **kwargs)
+
+        for command, workers in self.worker_servers.items():
+            for index in range(len(workers)):
+                self.send_request(
+                    (command, index), "FileNotification", **kwargs
+                )
+
+    def watch_responses(self) -> None:
+        """Has the event loop check responses as soon as they come in - internal API"""
+        if self.event_loop is None or self.event_loop.is_closed():
+            return
+
+        try:
+            self.event_loop.add_reader(
+                self.response_queue._reader.fileno(),  # type: ignore
+                self.check_responses,
+            )
+        except NotImplementedError:
+            # Some event loops (like the proactor loop on Windows) can't watch pipes so we poll instead
+            self.event_loop.create_task(self.poll_responses())
+
+    def stop_watching_responses(self) -> None:
+        """Stops the event loop from watching the current response queue - internal API"""
+        if self.event_loop is None or self.event_loop.is_closed():
+            return
+
+        try:
+            self.event_loop.remove_reader(self.response_queue._reader.fileno())  # type: ignore
+        except NotImplementedError:
+            # The polling task stops by itself once the response queue changes
+            pass
+
+    async def poll_responses(self) -> None:
+        """Checks responses until the response queue is replaced - internal API"""
+        response_queue = self.response_queue
+        while self.response_queue is response_queue:
+            self.check_responses()
+            await sleep(0.005)
+
+    def parse_response(self, res: Response) -> None:
+        """Parses server output and hands responses with a callback to it - internal API"""
+        partial: bool = res.get("partial", False)  # type: ignore
+        # The servers say if a result came from their ResultCache so we can count it (but responses keep their shape)
+        if "cached" in res:
+            if res.pop("cached"):  # type: ignore
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+        if partial:
+            # More of a streamed response is coming so its id is still in use
+            self.newest_responses[res["command"]].append(res)
+        else:
+            super().parse_response(res)
+
+        # Callbacks are given every chunk of a streamed response
+        callback: Callable[[Response], Any] | None = (
+            self.callbacks.get(res["id"])
+            if partial
+            else self.callbacks.pop(res["id"], None)
+        )
+        if callback is None:
+            if "command" in res:
+                self.merge_stream_chunks(res["command"])
+            return
+
+        if "command" in res:
+            # The callback gets the response so it shouldn't also be given by get_response()
+            self.newest_responses[res["command"]].pop()
+
+        callback(res)
+
+    def get_response(self, command: str) -> Response | list[Response] | None:
+        """Checks responses and returns the response to the newest request of type command if it has come in
+        (requests for other files can still be answered so there may be more than one waiting) - external API"""
+        if command not in self.commands or self.commands[command][1]:
+            return super().get_response(command)
+
+        self.check_responses()
+        responses: list[Response] = self.newest_responses[command]
+        self.newest_responses[command] = []
+        if not responses:
+            return None
+
+        for response in responses:
+            if response["id"] == self.newest_request_ids.get(command):
+                return response
+
+        # The newest request hasn't been answered yet so the newest response is the best we have
+        return responses[-1]
+
+    def merge_stream_chunks(self, command: COMMAND) -> None:
+        """Joins the newest chunk of a streamed response with the one before it if get_response() hasn't
+        given that one yet so no chunk is lost - internal API"""
+        responses: list[Response] = self.newest_responses[command]
+        if len(responses) < 2 or responses[-1]["id"] != responses[-2]["id"]:
+            return
+
+        newer: Response = responses.pop()
+        older_result: dict = responses[-1]["result"]  # type: ignore
+        newer_result: dict = newer["result"]  # type: ignore
+
+        tokens: list[Token] | array = (
+            older_result["tokens"] + newer_result["tokens"]
+        )
+        if isinstance(tokens, array):
+            # Compact Token's are relative to the Token before them so the chunks can't just be added together
+            tokens = encode_tokens(
+                decode_tokens(older_result["tokens"])
+                + decode_tokens(newer_result["tokens"])
+            )
+
+        responses[-1] = newer
+        newer["result"] = {
+            "lines": older_result["lines"] + newer_result["lines"],
+            "tokens": tokens,
+            "done": newer_result["done"],
+        }
+
     # Pyright likes to complain and say this won't work but it actually does
     # TODO: Use plum or custom multiple dispatch (make it a new project for salve organization)
     def request(  # type: ignore
@@ -54,28 +343,219 @@ class IPC(FileClient):
         language: str = "Text",
         text_range: tuple[int, int] = (1, -1),
         file_path: Path | str = Path(__file__),
-        definition_starters: list[tuple[str, str]] = [("", "before")],
-    ) -> None:
-        """Sends the main_server a request of type command with given kwargs - external API"""
+        definition_starters: list[tuple[str, str]] | None = [("", "before")],
+        priority: int | None = None,
+        deadline: float | None = None,
+        compact: bool = False,
+        diff: bool = False,
+        diff_base: int = 0,
+        workspace: bool = False,
+        max_results: int | None = None,
+        batch: list[tuple[str, str, tuple[int, int]]] | None = None,
+        stream: bool = False,
+        chunk_size: int = 1000,
+        visible_range: tuple[int, int] | None = None,
+    ) -> int:
+        """Sends the main_server (or the command's process worker) a request of type command with given kwargs - external API
+
+        Requests with a higher priority are handled first (defaults to the command's priority in DEFAULT_PRIORITIES)
+        and requests that haven't started deadline seconds after being made are cancelled. HIGHLIGHT and LINKS_AND_CHARS
+        results are given as an array to be decoded with decode_tokens() when compact is True. HIGHLIGHT results
+        are given as a diff from the response with the id diff_base (see apply_token_diff()) when diff is True.
+        AUTOCOMPLETE and REPLACEMENTS also use the words of every other file given to the IPC when workspace is True
+        and only give the best max_results words when it isn't None. A HIGHLIGHT request can be given a batch of
+        (file, language, text_range) instead of one file and gets the Token's of each (or None if that file changed).
+        A HIGHLIGHT request with stream set to True gives its result in chunks of chunk_size lines (visible_range first)
+        DEFINITION requests without definition_starters go to the same server as HIGHLIGHT to share its lexing
+
+        Returns the id of the request which can be given to IPC.add_callback()"""
         if command not in COMMANDS:
             raise Exception(
                 f"Command {command} not in builtin commands. Those are {COMMANDS}!"
             )
 
-        if file not in self.files and command != EDITORCONFIG:
+        if stream and (command != HIGHLIGHT or diff or batch is not None):
+            raise Exception(
+                f"Only {HIGHLIGHT} requests without diff or batch can be streamed!"
+            )
+
+        if chunk_size < 1:
+            raise Exception(
+                f"Chunk size must be at least one, not {chunk_size}!"
+            )
+
+        if batch is not None:
+            if command != HIGHLIGHT or diff:
+                raise Exception(
+                    f"Only {HIGHLIGHT} requests without diff can be batched!"
+                )
+
+            for batch_file, _, _ in batch:
+                if batch_file not in self.files:
+                    raise Exception(
+                        f"File {batch_file} does not exist in system!"
+                    )
+        elif file not in self.files and command != EDITORCONFIG:
             raise Exception(f"File {file} does not exist in system!")
 
         request: dict = {
-            "command": command,
             "expected_keywords": expected_keywords,
             "current_word": current_word,
             "language": language,
             "text_range": text_range,
             "file_path": file_path,
             "definition_starters": definition_starters,
+            "priority": (
+                DEFAULT_PRIORITIES[command] if priority is None else priority
+            ),
+            "compact": compact,
+            "diff": diff,
+            "diff_base": diff_base,
+            "workspace": workspace,
+            "max_results": max_results,
+            "stream": stream,
+            "chunk_size": chunk_size,
+            "visible_range": visible_range,
         }
 
+        if batch is not None:
+            # Each range carries its file's version so the server can tell which ones are out of date
+            request["batch"] = [
+                (
+                    batch_file,
+                    batch_language,
+                    batch_range,
+                    self.file_versions[batch_file],
+                )
+                for batch_file, batch_language, batch_range in batch
+            ]
+
+        if deadline is not None:
+            # The server runs in another process so it needs a clock that's the same in both
+            request["deadline"] = time() + deadline
+
         if file:
             request["file"] = file
 
-        super().request(**request)
+            # Lets the server cancel the request if the file changes before it gets to it
+            request["version"] = self.file_versions[file]
+
+        server_command: COMMAND = command
+        if (
+            command == DEFINITION
+            and definition_starters is None
+            and command not in self.thread_workers
+            and command not in self.worker_servers
+        ):
+            # Lexer definitions use the same lexed lines as highlighting so they go wherever HIGHLIGHT does
+            server_command = HIGHLIGHT
+
+        server: tuple[COMMAND, int] | None = None
+        if server_command in self.worker_servers:
+            # Requests for the same file always go to the same worker so newer ones can still replace older ones
+            server = (
+                server_command,
+                hash(file) % len(self.worker_servers[server_command]),
+            )
+
+        return self.send_request(server, command, **request)
+
+    def add_callback(
+        self, id: int, callback: Callable[[Response], Any]
+    ) -> None:
+        """Calls the callback with the response to the request with the given id once it comes in instead of
+        giving it through get_response(). Cancelled requests give a response without a result - external API
+
+        Without IPC.request_async() responses are only checked when get_response() is called"""
+
+        self.callbacks[id] = callback
+
+    async def request_async(self, command: COMMAND, **kwargs) -> Response:
+        """Same as IPC.request() but waits for the response without any polling - external API
+
+        Takes the same arguments as IPC.request() except stream as only one response can be awaited"""
+        if kwargs.get("stream"):
+            raise Exception(
+                "Streamed requests can't be awaited, use IPC.add_callback() to get every chunk!"
+            )
+
+        loop: AbstractEventLoop = get_running_loop()
+        if self.event_loop is not loop:
+            self.stop_watching_responses()
+            self.event_loop = loop
+            self.watch_responses()
+
+        future: Future[Response] = loop.create_future()
+
+        def set_response(response: Response) -> None:
+            # The future is already done if whoever was awaiting it got cancelled
+            if not future.done():
+                future.set_result(response)
+
+        self.add_callback(self.request(command, **kwargs), set_response)
+        return await future
+
+    def update_file(self, file: str, current_state: str) -> None:
+        """Updates files in the system - external API"""
+
+        self.files[file] = current_state
+        self.file_versions[file] = self.file_versions.get(file, 0) + 1
+
+        # We skip our own request() as it only deals with the user facing commands
+        self.notify_servers(
+            file=file,
+            remove=False,
+            contents=current_state,
+            version=self.file_versions[file],
+        )
+
+    def edit_file(
+        self,
+        file: str,
+        start: tuple[int, int],
+        end: tuple[int, int],
+        new_text: str,
+    ) -> int:
+        """Replaces the text between the start and end positions (line, column) of a file with the new text
+        and only sends the edit to the server instead of the whole file - external API
+
+        Returns the version number of the file after the edit"""
+
+        if file not in self.files:
+            raise Exception(f"File {file} does not exist in system!")
+
+        self.files[file] = apply_edit(self.files[file], start, end, new_text)
+        self.file_versions[file] += 1
+
+        self.notify_servers(
+            file=file,
+            remove=False,
+            edit=(start, end, new_text),
+            version=self.file_versions[file],
+        )
+
+        return self.file_versions[file]
+
+    def remove_file(self, file: str) -> None:
+        """Removes a file from the main_server - external API"""
+
+        if file not in self.files:
+            raise Exception(f"File {file} does not exist in system!")
+
+        self.notify_servers(file=file, remove=True)
+        self.files.pop(file)
+        self.file_versions.pop(file)
+
+    def kill_IPC(self) -> None:
+        """Kills the server processes and stops the event loop from watching them - external API"""
+
+        self.stop_watching_responses()
+        self.stop_workers()
+        super().kill_IPC()
+
+    def __del__(self) -> None:
+        self.stop_workers()
+
+        # The main process won't exist if __init__() raised before making it
+        if hasattr(self, "main_process"):
+            super().__del__()
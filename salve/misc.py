@@ -14,3 +14,107 @@ HIGHLIGHT: COMMAND = COMMANDS[2]
 EDITORCONFIG: COMMAND = COMMANDS[3]
 DEFINITION: COMMAND = COMMANDS[4]
 LINKS_AND_CHARS: COMMAND = COMMANDS[5]
+
+# Requests with a higher priority are handled first, these are used when a request isn't given one
+DEFAULT_PRIORITIES: dict[COMMAND, int] = {
+    AUTOCOMPLETE: 2,
+    REPLACEMENTS: 1,
+    DEFINITION: 1,
+    HIGHLIGHT: 0,
+    LINKS_AND_CHARS: 0,
+    EDITORCONFIG: 0,
+}
+
+# Commands can be run by workers so slow commands don't hold up the fast ones
+WORKER = str
+THREAD: WORKER = (
+    "thread"  # Runs in a thread of the server (best for I/O bound commands)
+)
+PROCESS: WORKER = (
+    "process"  # Runs in its own server process (best for CPU bound commands)
+)
+
+# These use the indexes the server keeps for each file which edits change in place so they can't run in threads
+INDEXED_COMMANDS: list[COMMAND] = [
+    AUTOCOMPLETE,
+    REPLACEMENTS,
+    HIGHLIGHT,
+    DEFINITION,
+]
+
+DEFAULT_WORKERS: dict[COMMAND, tuple[WORKER, int]] = {
+    HIGHLIGHT: (PROCESS, 1),
+    EDITORCONFIG: (THREAD, 2),
+}
+
+
+def position_to_index(split_text: list[str], position: tuple[int, int]) -> int:
+    """Turns a (line, column) position into an index of the text split by str.splitlines(keepends=True)"""
+    line, column = position
+
+    # The line after the last one is allowed so text can be added at the very end
+    if not 0 < line <= len(split_text) + 1:
+        raise Exception(f"Line {line} is not in the text!")
+
+    line_text: str = split_text[line - 1] if line <= len(split_text) else ""
+    line_length: int = len(line_text.splitlines()[0]) if line_text else 0
+    if not 0 <= column <= line_length:
+        raise Exception(f"Column {column} is not in line {line}!")
+
+    return sum(map(len, split_text[: line - 1])) + column
+
+
+def apply_edit(
+    full_text: str,
+    start: tuple[int, int],
+    end: tuple[int, int],
+    new_text: str,
+) -> str:
+    """Replaces the text between the start and end positions (end exclusive) with the new text"""
+    start_index, end_index = edit_indexes(full_text, start, end)
+    return full_text[:start_index] + new_text + full_text[end_index:]
+
+
+def edit_indexes(
+    full_text: str, start: tuple[int, int], end: tuple[int, int]
+) -> tuple[int, int]:
+    """Turns the start and end positions of an edit into indexes of the text"""
+    split_text: list[str] = full_text.splitlines(keepends=True)
+    start_index: int = position_to_index(split_text, start)
+    end_index: int = position_to_index(split_text, end)
+
+    if start_index > end_index:
+        raise Exception(f"Edit start {start} is after its end {end}!")
+
+    return (start_index, end_index)
+
+
+def stream_ranges(
+    text_range: tuple[int, int],
+    visible_range: tuple[int, int] | None,
+    chunk_size: int,
+) -> list[tuple[int, int]]:
+    """Splits a proper text range (see normal_text_range) into the order a streamed HIGHLIGHT gives it in: the visible
+    range first (or the first chunk) and then chunks of chunk_size lines going down and up from it in turns"""
+    start, end = text_range
+    if visible_range is None or not (
+        visible_range[0] <= end and visible_range[1] >= start
+    ):
+        visible_range = (start, start + chunk_size - 1)
+
+    ranges: list[tuple[int, int]] = [
+        (max(visible_range[0], start), min(visible_range[1], end))
+    ]
+    below: int = ranges[0][1] + 1
+    above: int = ranges[0][0] - 1
+
+    while below <= end or above >= start:
+        if below <= end:
+            ranges.append((below, min(below + chunk_size - 1, end)))
+            below += chunk_size
+
+        if above >= start:
+            ranges.append((max(above - chunk_size + 1, start), above))
+            above -= chunk_size
+
+    return ranges
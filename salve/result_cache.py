@@ -0,0 +1,131 @@
+from array import array
+from collections import OrderedDict
+from sys import getsizeof
+from threading import Lock
+
+from beartype.typing import Any
+from collegamento import Request
+
+# Request keys that don't change what the result is
+UNCACHED_KEYS: set[str] = {
+    "id",
+    "type",
+    "file",
+    "file_name",
+    "priority",
+    "deadline",
+}
+
+# Returned by ResultCache.get() when nothing is cached (None can be a real result)
+MISSING: object = object()
+
+
+def hashable(value: Any) -> Any:
+    """Turns the lists and dicts of a request argument into tuples so it can be part of a key"""
+    if isinstance(value, (list, tuple)):
+        return tuple(hashable(item) for item in value)
+
+    if isinstance(value, dict):
+        return tuple(
+            sorted((key, hashable(item)) for key, item in value.items())
+        )
+
+    return value
+
+
+def estimate_size(result: Any) -> int:
+    """Roughly how many bytes a result takes up without looking at every item of big results"""
+    if isinstance(result, array):
+        return getsizeof(result)
+
+    if isinstance(result, list):
+        if not result:
+            return getsizeof(result)
+
+        # Results are lists of the same kind of thing so the first item stands in for the rest
+        return getsizeof(result) + len(result) * estimate_size(result[0])
+
+    if isinstance(result, tuple):
+        # Tuples are small (like a Token and its position) so every item is counted
+        return getsizeof(result) + sum(estimate_size(item) for item in result)
+
+    if isinstance(result, dict):
+        return getsizeof(result) + sum(
+            estimate_size(key) + estimate_size(item)
+            for key, item in result.items()
+        )
+
+    return getsizeof(result)
+
+
+class ResultCache:
+    """A least recently used cache of command results keyed by the command, file version and request arguments.
+    Old results are thrown away once there are more than max_entries or they take up more than max_bytes"""
+
+    def __init__(
+        self, max_entries: int = 256, max_bytes: int = 64 * 2**20
+    ) -> None:
+        self.max_entries: int = max_entries
+        self.max_bytes: int = max_bytes
+
+        self.results: OrderedDict[tuple, tuple[Any, int]] = OrderedDict()
+        self.total_bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+
+        # Thread workers can use the cache at the same time as the server loop
+        self.lock: Lock = Lock()
+
+    @staticmethod
+    def request_key(request: Request) -> tuple | None:
+        """Returns the key a request's result is cached under or None if it can't be cached"""
+        if "version" not in request or "file_name" not in request:
+            # Without a version we can't know if the file is still the same
+            return None
+
+        return (
+            request["file_name"],
+            hashable(
+                {
+                    key: value
+                    for key, value in request.items()
+                    if key not in UNCACHED_KEYS
+                }
+            ),
+        )
+
+    def get(self, key: tuple) -> Any:
+        """Returns the cached result for the key (or MISSING) and counts the hit or miss"""
+        with self.lock:
+            if key not in self.results:
+                self.misses += 1
+                return MISSING
+
+            self.hits += 1
+            self.results.move_to_end(key)
+            return self.results[key][0]
+
+    def add(self, key: tuple, result: Any) -> None:
+        """Caches a result and throws away the least recently used ones that no longer fit"""
+        size: int = estimate_size(result)
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.results:
+                self.total_bytes -= self.results.pop(key)[1]
+
+            self.results[key] = (result, size)
+            self.total_bytes += size
+
+            while (
+                len(self.results) > self.max_entries
+                or self.total_bytes > self.max_bytes
+            ):
+                self.total_bytes -= self.results.popitem(last=False)[1][1]
+
+    def forget_file(self, file: str) -> None:
+        """Throws away every result for a file (its versions start over if it is added again)"""
+        with self.lock:
+            for key in [key for key in self.results if key[0] == file]:
+                self.total_bytes -= self.results.pop(key)[1]
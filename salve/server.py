@@ -0,0 +1,603 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import BoundedSemaphore
+from time import time
+from traceback import print_exc
+
+from beartype.typing import Any
+from collegamento import (
+    USER_FUNCTION,
+    FileServer,
+    Request,
+    RequestQueueType,
+    Response,
+    ResponseQueueType,
+)
+from collegamento.client_server.server import command_sort_func
+from token_tools import Token
+
+from .disk_cache import DiskCache
+from .misc import (
+    AUTOCOMPLETE,
+    DEFINITION,
+    HIGHLIGHT,
+    LINKS_AND_CHARS,
+    REPLACEMENTS,
+    edit_indexes,
+)
+from .result_cache import MISSING, ResultCache
+from .server_functions import DefinitionIndex, FileAnalysis, WordIndex
+from .server_functions.misc import find_words
+from .token_encoding import decode_tokens
+
+
+def update_files(server: "SalveServer", request: Request) -> None:
+    file: str = request["file"]  # type: ignore
+
+    # Indexes that can't be updated in place are simply rebuilt when next needed
+    server.definition_indexes.pop(file, None)
+
+    if request["remove"]:  # type: ignore
+        # Closing a file is when its results are most likely to be wanted again
+        server.save_results(file)
+        server.version_times.pop(file, None)
+        server.opened_files.discard(file)
+        server.result_cache.forget_file(file)
+        server.files.pop(file)
+        server.file_versions.pop(file, None)
+        server.drop_word_index(file)
+        server.highlight_results.pop(file, None)
+        server.analyses.pop(file, None)
+        return
+
+    server.file_versions[file] = request["version"]  # type: ignore
+    server.version_times[file] = time()
+
+    # The new version's analysis can reuse whatever it shares with the last one
+    previous_analysis: FileAnalysis | None = server.analyses.pop(file, None)
+    if previous_analysis is None:
+        server.opened_files.add(file)
+    else:
+        server.opened_files.discard(file)
+
+    if "edit" not in request:
+        server.files[file] = request["contents"]  # type: ignore
+        server.analyses[file] = FileAnalysis(
+            server.files[file], previous_analysis
+        )
+        server.drop_word_index(file)
+        return
+
+    start, end, new_text = request["edit"]  # type: ignore
+    old_contents: str = server.files[file]
+    start_index, end_index = edit_indexes(old_contents, start, end)
+    new_contents: str = (
+        old_contents[:start_index] + new_text + old_contents[end_index:]
+    )
+    server.files[file] = new_contents
+    server.analyses[file] = FileAnalysis(
+        new_contents,
+        previous_analysis,
+        (start_index, end_index, start_index + len(new_text)),
+    )
+
+    if file not in server.word_indexes:
+        return
+
+    # Only the lines the edit touched need to be taken out of and put back into the index.
+    # The line before the edit is included as text added at the end of the file joins the last line
+    old_lines: list[str] = (
+        old_contents.splitlines()
+        if previous_analysis is None
+        else previous_analysis.split_text
+    )
+    new_lines: list[str] = server.analyses[file].split_text
+    start_line: int = max(start[0] - 2, 0)
+    new_end_line: int = end[0] + len(new_lines) - len(old_lines)
+    removed_words: Counter[str] = Counter(
+        find_words("\n".join(old_lines[start_line : end[0]]))
+    )
+    added_words: Counter[str] = Counter(
+        find_words("\n".join(new_lines[start_line:new_end_line]))
+    )
+
+    # The workspace index gets the same change so it never has to look at the whole file again
+    for word_index in (server.word_indexes[file], server.workspace_index):
+        if word_index is None:
+            continue
+
+        word_index.remove_counts(removed_words)
+        word_index.add_counts(added_words)
+
+    server.mark_unsaved(file, "words")
+
+
+# How long a file has to stay the same before the server saves its results to the DiskCache when it has nothing to do
+SAVE_DELAY: float = 2.0
+
+# Commands whose result only depends on the file and the request (see cached_command())
+CACHED_COMMANDS: list[str] = [
+    AUTOCOMPLETE,
+    REPLACEMENTS,
+    HIGHLIGHT,
+    DEFINITION,
+    LINKS_AND_CHARS,
+]
+
+
+def cached_command(
+    function: USER_FUNCTION, server: "SalveServer", request: Request
+) -> Any:
+    """Runs a command through the server's ResultCache so repeated requests for the same file version are instant"""
+    # Diffs depend on the last result given, workspace requests on every other file and streams send most of their result on their own
+    key: tuple | None = (
+        None
+        if request.get("diff")
+        or request.get("workspace")
+        or request.get("stream")
+        else server.result_cache.request_key(request)
+    )
+    if key is None:
+        return function(server, request)
+
+    result: Any = server.result_cache.get(key)
+
+    # Lets the response say whether the result came from the cache (see SalveServer.respond())
+    request["cached"] = result is not MISSING  # type: ignore
+    if result is MISSING:
+        result = function(server, request)
+        server.result_cache.add(key, result)
+
+    return result
+
+
+class SalveServer(FileServer):
+    """Salve's variant of the FileServer that keeps per-file indexes around between requests"""
+
+    def __init__(
+        self,
+        commands: dict[str, tuple[USER_FUNCTION, bool]],
+        requests_queue: RequestQueueType,
+        response_queue: ResponseQueueType,
+        thread_workers: dict[str, int] = {},
+        cache_dir: str | None = None,
+    ) -> None:
+        # These need to be made before the super().__init__() call as it starts the main loop
+        self.file_versions: dict[str, int] = {}
+        self.word_indexes: dict[str, WordIndex] = {}
+        self.definition_indexes: dict[str, DefinitionIndex] = {}
+
+        # The word counts of every file in word_indexes added together, only made once something asks for it
+        self.workspace_index: WordIndex | None = None
+
+        # Everything worked out about the current version of each file
+        self.analyses: dict[str, FileAnalysis] = {}
+
+        # The last HIGHLIGHT result given for each file (by request id, with the text it was for) so the next one can be
+        # a diff of it
+        self.highlight_results: dict[str, tuple[int, str, list[Token]]] = {}
+
+        # Commands with thread workers run in their own pool with at most that many running at once
+        self.thread_pools: dict[str, ThreadPoolExecutor] = {
+            command: ThreadPoolExecutor(workers, f"salve-{command}")
+            for command, workers in thread_workers.items()
+        }
+        self.free_threads: dict[str, BoundedSemaphore] = {
+            command: BoundedSemaphore(workers)
+            for command, workers in thread_workers.items()
+        }
+
+        # Results of requests that are made again for the same version of a file are given straight from here
+        self.result_cache: ResultCache = ResultCache()
+
+        # Results that outlive the server (only when the IPC is given a cache directory)
+        self.disk_cache: DiskCache | None = (
+            None if cache_dir is None else DiskCache(cache_dir)
+        )
+
+        # Results are only looked up for the version a file was opened with so edited versions are never hashed
+        self.opened_files: set[str] = set()
+
+        # The (kind, language) of each result worked out for a file that isn't saved yet and when the
+        # file last changed. They are saved once the file stops changing (see save_settled_files())
+        self.unsaved_results: dict[str, set[tuple[str, str]]] = {}
+        self.version_times: dict[str, float] = {}
+        for command in CACHED_COMMANDS:
+            if command in commands:
+                function, single = commands[command]
+                commands[command] = (partial(cached_command, function), single)
+
+        # Our notifications can also carry versions and edits
+        commands["FileNotification"] = (update_files, True)
+
+        super().__init__(commands, requests_queue, response_queue)
+
+    def get_analysis(self, file: str) -> FileAnalysis:
+        """Returns the FileAnalysis for the current version of a file"""
+        if file not in self.analyses:
+            self.analyses[file] = FileAnalysis(self.files[file])
+
+        return self.analyses[file]
+
+    def get_word_index(self, file: str) -> WordIndex:
+        """Returns the WordIndex for the current version of a file, only building it if needed"""
+        if file not in self.word_indexes:
+            self.word_indexes[file] = self.build_word_index(file)
+
+            if self.workspace_index is not None:
+                self.workspace_index.add_counts(
+                    self.word_indexes[file].word_counts
+                )
+
+        return self.word_indexes[file]
+
+    def build_word_index(self, file: str) -> WordIndex:
+        """Builds the WordIndex of a file from the words saved in the DiskCache if it can"""
+        analysis: FileAnalysis = self.get_analysis(file)
+        if self.disk_cache is None:
+            return WordIndex(self.files[file], analysis.all_line_words())
+
+        if file in self.opened_files:
+            word_counts: Any = self.disk_cache.load_value(
+                analysis.content_hash(), "words"
+            )
+            if isinstance(word_counts, dict):
+                word_index: WordIndex = WordIndex()
+                word_index.add_counts(Counter(word_counts))
+                return word_index
+
+        self.mark_unsaved(file, "words")
+        return WordIndex(self.files[file], analysis.all_line_words())
+
+    def get_highlights(
+        self, file: str, language: str, text_range: tuple[int, int]
+    ) -> list[Token]:
+        """Returns the Token's of a file in the text range. With a DiskCache the Token's of the whole file are
+        loaded from it if they were saved and kept to be saved whenever the whole file is highlighted
+        """
+        analysis: FileAnalysis = self.get_analysis(file)
+        if self.disk_cache is None:
+            return analysis.highlights(language, text_range)
+
+        if (
+            file in self.opened_files
+            and language not in analysis.full_highlights
+        ):
+            saved_tokens: array | None = self.disk_cache.load_tokens(
+                analysis.content_hash(), language
+            )
+            if saved_tokens is not None:
+                analysis.full_highlights[language] = decode_tokens(
+                    saved_tokens
+                )
+
+        tokens: list[Token] = analysis.highlights(language, text_range)
+        if self.proper_text_range(file, text_range) == (
+            1,
+            max(len(analysis.split_text), 1),
+        ):
+            self.save_full_highlights(file, language, tokens)
+
+        return tokens
+
+    def save_full_highlights(
+        self, file: str, language: str, tokens: list[Token]
+    ) -> None:
+        """Keeps the Token's of a whole file to be saved to the DiskCache (if there is one and they aren't kept already)"""
+        analysis: FileAnalysis = self.get_analysis(file)
+        if self.disk_cache is None or language in analysis.full_highlights:
+            return
+
+        analysis.full_highlights[language] = sorted(tokens)
+        self.mark_unsaved(file, "tokens", language)
+
+    def proper_text_range(
+        self, file: str, text_range: tuple[int, int]
+    ) -> tuple[int, int]:
+        """Same as the text range normal_text_range() gives but without splitting the file again"""
+        line_count: int = max(len(self.get_analysis(file).split_text), 1)
+        if text_range[1] == -1 or text_range[1] > line_count:
+            return (text_range[0], line_count)
+
+        return text_range
+
+    def get_batch_highlights(
+        self, batch: list[tuple[str, str, tuple[int, int], int]]
+    ) -> list[list[Token] | None]:
+        """Returns the Token's of each (file, language, text range, version) in the batch (or None if the file
+        changed since). Overlapping ranges of the same file and language are highlighted together and split up after
+        """
+        results: list[list[Token] | None] = [None] * len(batch)
+        ranges: dict[tuple[str, str], list[tuple[int, int, int]]] = {}
+
+        for index, (file, language, text_range, version) in enumerate(batch):
+            if self.file_versions.get(file) != version:
+                continue
+
+            start, end = self.proper_text_range(file, text_range)
+            ranges.setdefault((file, language), []).append((start, end, index))
+
+        for (file, language), file_ranges in ranges.items():
+            file_ranges.sort()
+
+            # Ranges that overlap or touch become one span that is only highlighted once
+            spans: list[tuple[int, int, list[tuple[int, int, int]]]] = []
+            for start, end, index in file_ranges:
+                if spans and start <= spans[-1][1] + 1:
+                    spans[-1] = (
+                        spans[-1][0],
+                        max(end, spans[-1][1]),
+                        spans[-1][2] + [(start, end, index)],
+                    )
+                    continue
+
+                spans.append((start, end, [(start, end, index)]))
+
+            for span_start, span_end, span_ranges in spans:
+                tokens: list[Token] = sorted(
+                    self.get_highlights(file, language, (span_start, span_end))
+                )
+                for start, end, index in span_ranges:
+                    results[index] = tokens[
+                        bisect_left(tokens, ((start, 0),)) : bisect_left(
+                            tokens, ((end + 1, 0),)
+                        )
+                    ]
+
+        return results
+
+    def stream_superseded(self, request: Request) -> bool:
+        """Takes any requests that came in while a request was streamed and returns whether one replaces it
+        (a newer request of the same command for the same file or a change to the file)
+        """
+        if request["command"] in self.thread_pools:
+            # Only the server loop can take new requests
+            return False
+
+        self.take_new_requests()
+        return any(
+            other_request.get("file") == request["file_name"]  # type: ignore
+            for other_request in self.newest_requests[request["command"]]
+            + self.newest_requests["FileNotification"]
+        )
+
+    def get_declarations(self, file: str, language: str) -> FileAnalysis:
+        """Returns the FileAnalysis of a file with its declarations for the language loaded from
+        (or kept to be saved to) the DiskCache"""
+        analysis: FileAnalysis = self.get_analysis(file)
+        if self.disk_cache is None or language in analysis.declaration_tables:
+            return analysis
+
+        if file in self.opened_files:
+            table: Any = self.disk_cache.load_value(
+                analysis.content_hash(), "declarations", language
+            )
+            if isinstance(table, dict):
+                analysis.declaration_tables[language] = table
+                return analysis
+
+        analysis.declarations(language)
+        self.mark_unsaved(file, "declarations", language)
+        return analysis
+
+    def mark_unsaved(self, file: str, kind: str, language: str = "") -> None:
+        """Notes a result of a file that should be saved to the DiskCache once the file stops changing"""
+        if self.disk_cache is not None:
+            self.unsaved_results.setdefault(file, set()).add((kind, language))
+
+    def save_results(self, file: str) -> None:
+        """Saves the unsaved results of the current version of a file to the DiskCache"""
+        results: set[tuple[str, str]] = self.unsaved_results.pop(file, set())
+        analysis: FileAnalysis | None = self.analyses.get(file)
+        if self.disk_cache is None or not results or analysis is None:
+            return
+
+        # Results of older versions that weren't worked out again for this one are skipped
+        for kind, language in results:
+            if kind == "tokens" and language in analysis.full_highlights:
+                self.disk_cache.save_tokens(
+                    analysis.content_hash(),
+                    language,
+                    analysis.full_highlights[language],
+                )
+            elif (
+                kind == "declarations"
+                and language in analysis.declaration_tables
+            ):
+                self.disk_cache.save_value(
+                    analysis.content_hash(),
+                    kind,
+                    analysis.declaration_tables[language],
+                    language,
+                )
+            elif kind == "words" and file in self.word_indexes:
+                self.disk_cache.save_value(
+                    analysis.content_hash(),
+                    kind,
+                    dict(self.word_indexes[file].word_counts),
+                )
+
+    def save_settled_files(self) -> None:
+        """Saves the results of every file that hasn't changed for SAVE_DELAY seconds"""
+        if not self.unsaved_results:
+            return
+
+        for file in list(self.unsaved_results):
+            if time() - self.version_times.get(file, 0) >= SAVE_DELAY:
+                self.save_results(file)
+
+    def drop_word_index(self, file: str) -> None:
+        """Throws away the WordIndex of a file (and takes its words out of the workspace index)"""
+        word_index: WordIndex | None = self.word_indexes.pop(file, None)
+        if word_index is not None and self.workspace_index is not None:
+            self.workspace_index.remove_counts(word_index.word_counts)
+
+    def get_workspace_index(self) -> WordIndex:
+        """Returns a WordIndex of every file on the server, only looking at files whose WordIndex isn't built yet"""
+        if self.workspace_index is None:
+            self.workspace_index = WordIndex()
+            for word_index in self.word_indexes.values():
+                self.workspace_index.add_counts(word_index.word_counts)
+
+        for file in self.files:
+            # Adds the file to the workspace index if it isn't there yet
+            self.get_word_index(file)
+
+        return self.workspace_index
+
+    def get_definition_index(self, file: str) -> DefinitionIndex:
+        """Returns the DefinitionIndex for the current version of a file, only building it if needed"""
+        if file not in self.definition_indexes:
+            self.definition_indexes[file] = DefinitionIndex(
+                self.files[file], self.get_analysis(file).all_line_words()
+            )
+
+        return self.definition_indexes[file]
+
+    def parse_line(self, message: Request) -> None:
+        command: str = message.get("command", "")
+        if (
+            message["type"] != "request"
+            or command not in self.commands
+            or self.commands[command][1]
+        ):
+            super().parse_line(message)
+            return
+
+        # Only the newest request for each command and file is kept and the replaced ones are cancelled
+        # here as they may have been taken in an earlier round that cancel_old_ids() has forgotten
+        file: str | None = message.get("file")  # type: ignore
+        for old_request in list(self.newest_requests[command]):
+            if old_request.get("file") != file:
+                continue
+
+            self.newest_requests[command].remove(old_request)
+            self.newest_ids[command].remove(old_request["id"])
+            if old_request["id"] in self.all_ids:
+                # Otherwise cancel_old_ids() would answer it a second time
+                self.all_ids.remove(old_request["id"])
+            self.simple_id_response(old_request["id"])
+
+        self.all_ids.append(message["id"])
+        self.newest_ids[command].append(message["id"])
+        self.newest_requests[command].append(message)
+
+    def take_new_requests(self) -> None:
+        """Takes every request waiting in the queue and cancels the ones they replace"""
+        while not self.requests_queue.empty():
+            self.parse_line(self.requests_queue.get())
+
+        self.cancel_old_ids()
+
+    def next_request(self) -> Request | None:
+        """Removes and returns the request that should be handled next (notifications first and then the
+        highest priority). Requests for commands whose threads are all busy wait where newer requests can still replace them
+        """
+        requests_list: list[Request] = sorted(
+            [
+                request
+                for request_list in self.newest_requests.values()
+                for request in request_list
+            ],
+            key=lambda request: (
+                command_sort_func(request, self.priority_commands),
+                -request.get("priority", 0),  # type: ignore
+            ),
+        )
+
+        for request in requests_list:
+            command: str = request["command"]
+            if command in self.free_threads and not self.free_threads[
+                command
+            ].acquire(blocking=False):
+                continue
+
+            self.newest_requests[command].remove(request)
+            return request
+
+        return None
+
+    def run_tasks(self) -> None:
+        if self.requests_queue.empty() and not any(
+            self.newest_requests.values()
+        ):
+            # Saving only happens when there's nothing else to do so it never holds up a request
+            self.save_settled_files()
+            return
+
+        self.take_new_requests()
+
+        while (request := self.next_request()) is not None:
+            self.handle_request(request)
+
+            # Anything that came in while that request was handled can replace requests still waiting
+            self.take_new_requests()
+
+    def handle_request(self, request: Request) -> None:
+        if "file" in request and request["command"] != "FileNotification":
+            file: str = request["file"]  # type: ignore
+
+            version: int | None = request.get("version")  # type: ignore
+            if version is not None and version != self.file_versions.get(file):
+                # The file changed after the request was made so the result would be stale
+                self.cancel_request(request)
+                return
+
+            # The FileServer swaps the file name for its contents so we keep it for the wrappers
+            request["file_name"] = file  # type: ignore
+
+        if "deadline" in request and time() > request["deadline"]:  # type: ignore
+            # The client doesn't want the result anymore so there's no point in working on it
+            self.cancel_request(request)
+            return
+
+        # The FileServer's swap of the file name for its contents (done here as a thread could otherwise see a newer version)
+        if "file" in request and request["command"] != "FileNotification":
+            request["file"] = self.files[request["file"]]  # type: ignore
+
+        if request["command"] not in self.thread_pools:
+            self.respond(request)
+            return
+
+        self.thread_pools[request["command"]].submit(
+            self.handle_request_in_thread, request
+        )
+
+    def cancel_request(self, request: Request) -> None:
+        """Gives a cancelled response to a request taken by next_request() instead of handling it"""
+        self.newest_ids[request["command"]].remove(request["id"])
+        self.simple_id_response(request["id"])
+
+        if request["command"] in self.free_threads:
+            self.free_threads[request["command"]].release()
+
+    def respond(self, request: Request) -> None:
+        """Same as Server.handle_request() but the response also says whether the result came from the ResultCache"""
+        command: str = request["command"]
+        response: Response = {
+            "id": request["id"],
+            "type": "response",
+            "cancelled": False,
+            "command": command,
+            "result": self.commands[command][0](self, request),
+        }
+        if "cached" in request:
+            response["cached"] = request["cached"]  # type: ignore
+
+        self.response_queue.put(response)
+        self.newest_ids[command].remove(request["id"])
+
+    def handle_request_in_thread(self, request: Request) -> None:
+        try:
+            self.respond(request)
+        except Exception:
+            # The error would otherwise vanish with the thread so its traceback is printed like the
+            # server loop's would be and the client is told the request won't finish
+            print_exc()
+            self.newest_ids[request["command"]].remove(request["id"])
+            self.simple_id_response(request["id"])
+        finally:
+            self.free_threads[request["command"]].release()
@@ -1,6 +1,17 @@
+from .analysis import FileAnalysis, changed_lines  # noqa: F401
 from .autocompletions import find_autocompletions  # noqa: F401
-from .definitions import get_definition  # noqa: F401
+from .definitions import (  # noqa: F401
+    DefinitionIndex,
+    get_definition,
+    get_lexer_definition,
+)
+from .editorconfig import get_editorconfig  # noqa: F401
 from .highlight import get_highlights  # noqa: F401
 from .links_and_hidden_chars import get_special_tokens  # noqa: F401
-from .misc import is_unicode_letter  # noqa: F401
+from .misc import (  # noqa: F401
+    find_words,
+    is_unicode_letter,
+    iter_words,
+)
 from .replacements import get_replacements  # noqa: F401
+from .word_index import WordIndex  # noqa: F401
@@ -0,0 +1,286 @@
+from bisect import bisect_left, bisect_right
+from hashlib import sha256
+from itertools import chain
+
+from pygments.lexer import Lexer, RegexLexer
+from token_tools import Token, normal_text_range
+
+from .highlight.docstring_highlight import CommentScan
+from .highlight.highlight import (
+    _LineTokens,
+    highlight_lexed_lines,
+    lex_line,
+    lexer_by_name_cached,
+)
+from .misc import find_words
+
+# Pygments token types (and their subtypes) that declare a name
+DECLARATION_TYPES: tuple[str, ...] = (
+    "Token.Name.Function",
+    "Token.Name.Class",
+)
+
+
+def changed_region(old_text: str, new_text: str) -> tuple[int, int, int]:
+    """Returns where the lines that changed between two versions of a file start, where they end in the old
+    version, and where they end in the new one (the same as the indexes an edit gives)"""
+    old_lines: list[str] = old_text.splitlines(keepends=True)
+    new_lines: list[str] = new_text.splitlines(keepends=True)
+
+    start_lines: int = 0
+    while (
+        start_lines < min(len(old_lines), len(new_lines))
+        and old_lines[start_lines] == new_lines[start_lines]
+    ):
+        start_lines += 1
+
+    end_lines: int = 0
+    while (
+        end_lines < min(len(old_lines), len(new_lines)) - start_lines
+        and old_lines[-end_lines - 1] == new_lines[-end_lines - 1]
+    ):
+        end_lines += 1
+
+    start: int = sum(map(len, new_lines[:start_lines]))
+    end_length: int = sum(map(len, new_lines[len(new_lines) - end_lines :]))
+    return (start, len(old_text) - end_length, len(new_text) - end_length)
+
+
+def changed_lines(old_text: str, new_text: str) -> tuple[int, int, int]:
+    """Returns the first line that changed between two versions of a file, the first line after the change in
+    the old version, and how many lines the change added (negative if it removed lines)"""
+    start, old_end, new_end = changed_region(old_text, new_text)
+    end_line: int = old_text.count("\n", 0, old_end) + 1
+    return (
+        new_text.count("\n", 0, start) + 1,
+        end_line,
+        new_text.count("\n", 0, new_end) + 1 - end_line,
+    )
+
+
+class FileAnalysis:
+    """Everything the commands need to know about one version of a file. Each line is only lexed or split
+    into words once no matter how many commands ask about it and nothing is worked out until it is needed"""
+
+    def __init__(
+        self,
+        full_text: str,
+        previous: "FileAnalysis | None" = None,
+        edit: tuple[int, int, int] | None = None,
+    ) -> None:
+        self.full_text: str = full_text
+        self.split_text: list[str] = full_text.splitlines()
+
+        # Lines are looked up by their text so lines the last version already split are reused
+        self.words_by_line: dict[str, list[str]] = {}
+        self.previous_words_by_line: dict[str, list[str]] = (
+            {} if previous is None else previous.words_by_line
+        )
+
+        # The lexed lines (by line number) for each language the file has been lexed as
+        self.lexed_lines: dict[str, list[_LineTokens | None]] = {}
+
+        # Lexed lines by their text for each language. Every version of the file shares these so an
+        # edit only lexes the lines it changed no matter how many other files are open
+        self.lexed_by_text: dict[str, dict[str, _LineTokens]] = (
+            {} if previous is None else previous.lexed_by_text
+        )
+        self.comment_scans: dict[RegexLexer, CommentScan] = {}
+
+        # The newest scan of an older version for each lexer and the region of its text that changed since
+        # (start, end in its text, end in ours) so our scans can reuse its matches outside of that region
+        self.base_scans: dict[
+            RegexLexer, tuple[CommentScan, tuple[int, int, int]]
+        ] = {}
+        if previous is not None and (
+            previous.comment_scans or previous.base_scans
+        ):
+            # The edit (start, old end, new end) is worked out if we weren't given it
+            start, old_end, new_end = (
+                changed_region(previous.full_text, full_text)
+                if edit is None
+                else edit
+            )
+            for lexer, (scan, region) in previous.base_scans.items():
+                # The text after both regions is the same in every version
+                unchanged: int = max(region[2], old_end)
+                self.base_scans[lexer] = (
+                    scan,
+                    (
+                        min(region[0], start),
+                        unchanged - region[2] + region[1],
+                        unchanged + new_end - old_end,
+                    ),
+                )
+
+            for lexer, scan in previous.comment_scans.items():
+                self.base_scans[lexer] = (scan, (start, old_end, new_end))
+        self.declaration_tables: dict[str, dict[str, Token]] = {}
+
+        # The Token's of the whole file for each language (only kept when given by the server's DiskCache)
+        self.full_highlights: dict[str, list[Token]] = {}
+        self.hash: str | None = None
+
+    def content_hash(self) -> str:
+        """Returns a hash of the file's contents that stays the same between runs"""
+        if self.hash is None:
+            self.hash = sha256(
+                self.full_text.encode("utf-8", "surrogatepass")
+            ).hexdigest()
+
+        return self.hash
+
+    def line_words(self, line: str) -> list[str]:
+        """Returns the words in a line of the file"""
+        if line not in self.words_by_line:
+            self.words_by_line[line] = (
+                self.previous_words_by_line[line]
+                if line in self.previous_words_by_line
+                else find_words(line)
+            )
+
+        return self.words_by_line[line]
+
+    def all_line_words(self) -> list[list[str]]:
+        """Returns the words in each line of the file"""
+        words: list[list[str]] = [
+            self.line_words(line) for line in self.split_text
+        ]
+
+        # Every line has been split so the last version's words aren't needed anymore
+        self.previous_words_by_line = {}
+        return words
+
+    def lexed_line(self, line_number: int, language: str) -> _LineTokens:
+        """Returns the (column, length, token type, pygments token type) tuples of a line"""
+        if language not in self.lexed_lines:
+            self.lexed_lines[language] = [None] * len(self.split_text)
+
+        if line_number > len(self.split_text):
+            # Empty files still have a line to lex
+            return lex_line("", language)
+
+        lexed_lines: list[_LineTokens | None] = self.lexed_lines[language]
+        line_tokens: _LineTokens | None = lexed_lines[line_number - 1]
+        if line_tokens is not None:
+            return line_tokens
+
+        line: str = self.split_text[line_number - 1]
+        lexed_by_text: dict[str, _LineTokens] = self.lexed_by_text.setdefault(
+            language, {}
+        )
+        if line not in lexed_by_text:
+            if len(lexed_by_text) > 2 * len(self.split_text) + 1024:
+                self.forget_old_lines(lexed_by_text)
+
+            lexed_by_text[line] = lex_line(line, language)
+
+        line_tokens = lexed_by_text[line]
+        lexed_lines[line_number - 1] = line_tokens
+        return line_tokens
+
+    def forget_old_lines(self, lexed_by_text: dict[str, _LineTokens]) -> None:
+        """Throws away the lexed lines that aren't in this version of the file anymore (in place so every
+        version still shares them)"""
+        kept_lines: dict[str, _LineTokens] = {
+            line: lexed_by_text[line]
+            for line in self.split_text
+            if line in lexed_by_text
+        }
+        lexed_by_text.clear()
+        lexed_by_text.update(kept_lines)
+
+    def comment_scan(self, lexer: RegexLexer) -> CommentScan:
+        """Returns the docstring and multiline comment scan of the file for the lexer"""
+        if lexer not in self.comment_scans:
+            scan: CommentScan = CommentScan(lexer, self.full_text)
+            if lexer in self.base_scans:
+                scan.reuse(*self.base_scans.pop(lexer))
+
+            self.comment_scans[lexer] = scan
+
+        return self.comment_scans[lexer]
+
+    def declarations(self, language: str) -> dict[str, Token]:
+        """Returns the first place each function or class name is declared according to the lexer
+        (ignoring any that are really inside of docstrings or multiline comments)"""
+        if language in self.declaration_tables:
+            return self.declaration_tables[language]
+
+        lexer: Lexer = lexer_by_name_cached(language)
+        comment_spans: list[tuple[int, int]] = []
+        line_starts: list[int] = []
+        if isinstance(lexer, RegexLexer):
+            # Lines are lexed on their own so code in a docstring looks just like real code
+            scan: CommentScan = self.comment_scan(lexer)
+            scan.scan_until(len(self.full_text))
+            line_starts = scan.line_starts
+
+            # Different regexes can match inside of each other so overlapping spans are merged
+            for start, end in sorted(chain.from_iterable(scan.matches)):
+                if comment_spans and start <= comment_spans[-1][1]:
+                    comment_spans[-1] = (
+                        comment_spans[-1][0],
+                        max(end, comment_spans[-1][1]),
+                    )
+                    continue
+
+                comment_spans.append((start, end))
+
+        span_starts: list[int] = [span[0] for span in comment_spans]
+
+        table: dict[str, Token] = {}
+        for line_number, line in enumerate(self.split_text, 1):
+            for column, length, _, pygments_type in self.lexed_line(
+                line_number, language
+            ):
+                if not pygments_type.startswith(DECLARATION_TYPES):
+                    continue
+
+                name: str = line[column : column + length]
+                if name in table:
+                    continue
+
+                if comment_spans:
+                    index: int = line_starts[line_number - 1] + column
+                    span: int = bisect_right(span_starts, index) - 1
+                    if span >= 0 and index < comment_spans[span][1]:
+                        continue
+
+                table[name] = ((line_number, column), length, "Definition")
+
+        self.declaration_tables[language] = table
+        return table
+
+    def highlights(
+        self, language: str, text_range: tuple[int, int] = (1, -1)
+    ) -> list[Token]:
+        """Same as get_highlights() but only lexes lines this version of the file hasn't lexed yet"""
+        lexer: Lexer = lexer_by_name_cached(language)
+        split_text, text_range = normal_text_range(self.full_text, text_range)
+
+        if language in self.full_highlights:
+            # Highlighting part of a file gives the same Token's as highlighting all of it and taking that part
+            tokens: list[Token] = self.full_highlights[language]
+            return tokens[
+                bisect_left(tokens, ((text_range[0], 0),)) : bisect_left(
+                    tokens, ((text_range[1] + 1, 0),)
+                )
+            ]
+
+        lexed_lines: list[_LineTokens] = [
+            self.lexed_line(line_number, language)
+            for line_number in range(
+                text_range[0], text_range[0] + len(split_text)
+            )
+        ]
+
+        return highlight_lexed_lines(
+            lexer,
+            self.full_text,
+            text_range,
+            lexed_lines,
+            self.comment_scan(lexer)
+            if isinstance(lexer, RegexLexer)
+            else None,
+        )
@@ -1,36 +1,55 @@
-from .misc import find_words
+from heapq import nsmallest
+from operator import neg
+
+from .word_index import WordIndex, workspace_counts
 
 
 def find_autocompletions(
-    full_text: str, expected_keywords: list[str], current_word: str
+    full_text: str,
+    expected_keywords: list[str],
+    current_word: str,
+    word_index: WordIndex | None = None,
+    workspace_index: WordIndex | None = None,
+    max_results: int | None = None,
 ) -> list[str]:
-    """Returns a list of autocompletions based on the word, text, and language keywords"""
+    """Returns a list of autocompletions based on the word, text, and language keywords
+    (and the words of every other file if given a workspace_index)"""
 
-    words_in_text: list[str] = find_words(full_text)
+    if word_index is None:
+        # Without an index from the server we have to build one for this request
+        word_index = WordIndex(full_text)
 
-    words_after_original_removal = [
-        word for word in words_in_text if word != current_word
-    ]
+    words: list[str] = (workspace_index or word_index).words_with_prefix(
+        current_word
+    )
+    if words and words[0] == current_word:
+        # The word itself is always sorted first if it's there
+        words = words[1:]
 
-    relevant_words = [
-        word
-        for word in words_after_original_removal
-        if word.startswith(current_word)
-    ]
+    relevant_words: dict[str, int] = dict(
+        zip(words, workspace_counts(words, word_index, workspace_index))
+    )
 
     no_usable_words_in_text: bool = not relevant_words
     if no_usable_words_in_text:
-        relevant_words.extend(
-            expected_keywords * 3
-        )  # We add a multiplier of three to boost the score of keywords
+        for keyword in expected_keywords:
+            if not keyword.startswith(current_word):
+                continue
+
+            # We add a multiplier of three to boost the score of keywords
+            relevant_words[keyword] = relevant_words.get(keyword, 0) + 3
+
+    # Each word is ranked by (-score, length, word), the tuples are made with map() as there can be thousands
+    ranks = zip(
+        map(neg, relevant_words.values()),
+        map(len, relevant_words),
+        relevant_words,
+    )
 
-    relevant_words = [
-        word for word in relevant_words if word.startswith(current_word)
-    ]
+    if max_results is not None:
+        # Only the best few are wanted so we don't need to sort everything
+        return [word for _, _, word in nsmallest(max_results, ranks)]
 
-    autocomplete_matches = sorted(
-        set(relevant_words),
-        key=(lambda s: (-relevant_words.count(s), len(s), s)),
-    )
+    autocomplete_matches = [word for _, _, word in sorted(ranks)]
 
     return autocomplete_matches
@@ -1,20 +1,49 @@
+from functools import lru_cache
 from re import Match, Pattern, compile
 
 from token_tools import Token
 
+from .analysis import FileAnalysis
 from .misc import find_words
 
+_DefinitionStarters = tuple[tuple[str, str], ...]
 
-def get_definition(
-    full_text: str,
-    definition_starters: list[tuple[str, str]],
-    word_to_find: str,
-) -> Token:
-    """Finds all definitions of a given word in text using language definition starters"""
-    default_pos = ((0, 0), 0, "Definition")
-    split_text: list[str] = full_text.splitlines()
 
-    regex_possibilities: list[tuple[Pattern, str]] = [
+class DefinitionIndex:
+    """Keeps track of which lines every word of a text is on so definitions are only
+    searched for on the lines that actually have the word"""
+
+    def __init__(
+        self, full_text: str = "", line_words: list[list[str]] | None = None
+    ) -> None:
+        self.split_text: list[str] = full_text.splitlines()
+        self.word_lines: dict[str, list[int]] = {}
+
+        # The words of each line can be given if they were already found (see FileAnalysis)
+        if line_words is None:
+            line_words = [find_words(line) for line in self.split_text]
+
+        for line_number, words in enumerate(line_words, 1):
+            for word in dict.fromkeys(words):
+                self.word_lines.setdefault(word, []).append(line_number)
+
+        # Definitions already found in this version of the text
+        self.definitions: dict[tuple[_DefinitionStarters, str], Token] = {}
+
+    def candidate_lines(self, word: str) -> list[int]:
+        """Returns the line numbers a definition of the word could possibly be on"""
+        if find_words(word) != [word]:
+            # The word isn't made of letters so it can't be looked up and any line could have it
+            return list(range(1, len(self.split_text) + 1))
+
+        return self.word_lines.get(word, [])
+
+
+@lru_cache(maxsize=256)
+def definition_regexes(
+    definition_starters: _DefinitionStarters, word_to_find: str
+) -> list[tuple[Pattern, str]]:
+    return [
         (
             (compile(definition[0] + word_to_find), definition[0])
             if definition[1] == "after"
@@ -27,52 +56,107 @@ def get_definition(
         for definition in definition_starters
     ]
 
-    matches: list[tuple[Match, str, tuple[int, int]]] = []
-    for regex, definition in regex_possibilities:
-        start_pos: tuple[int, int] = (1, 0)
 
-        while True:
-            if start_pos[0] > len(split_text):
-                break
+def find_definition_in_line(
+    line_text: str, line_number: int, regex: Pattern, word_to_find: str
+) -> Token | None:
+    """Checks every match of the regex in the line and returns the first one that is really the word"""
+    start_col: int = 0
 
-            line: str = split_text[start_pos[0] - 1][start_pos[1] :]
-            match_start: Match[str] | None = regex.search(line)
+    while True:
+        line: str = line_text[start_col:]
+        match_start: Match[str] | None = regex.search(line)
 
-            if not match_start:
-                start_pos = (start_pos[0] + 1, 0)
-                continue
+        if not match_start:
+            return None
 
-            matches.append((match_start, definition, start_pos))
-            span = match_start.span()
-            start_pos = (start_pos[0], start_pos[1] + span[0] + span[1])
+        match_str: str = str(match_start.string)
+        span = match_start.span()
 
-    if not len(matches):
-        return default_pos
+        if word_to_find in find_words(match_str):
+            true_end: int = start_col + span[1]
+            true_start: int = true_end - len(word_to_find)
 
-    for best_match in matches:
-        match_str: str = str(best_match[0].string)
+            if match_str.startswith(word_to_find):
+                true_start = 0
+                true_end = len(word_to_find)
 
-        if word_to_find not in find_words(match_str):
-            continue
+            if match_str.find(word_to_find) < true_start:
+                true_start = match_str.find(word_to_find)
+                true_end = true_start + len(word_to_find)
 
-        true_end: int = best_match[2][1] + best_match[0].span()[1]
-        true_start: int = true_end - len(word_to_find)
+            word_found: str = match_str[true_start:true_end]
 
-        if match_str.startswith(word_to_find):
-            true_start = 0
-            true_end = len(word_to_find)
+            if word_found == word_to_find:
+                return (
+                    (line_number, true_start),
+                    len(word_to_find),
+                    "Definition",
+                )
 
-        if match_str.find(word_to_find) < true_start:
-            true_start = match_str.find(word_to_find)
-            true_end = true_start + len(word_to_find)
+        start_col = start_col + span[0] + span[1]
 
-        word_found: str = str(best_match[0].string)[true_start:true_end]
 
-        if word_found == word_to_find:
-            return (
-                (best_match[2][0], true_start),
-                len(word_to_find),
-                "Definition",
+def find_definition(
+    definition_index: DefinitionIndex,
+    definition_starters: _DefinitionStarters,
+    word_to_find: str,
+) -> Token:
+    candidate_lines: list[int] = definition_index.candidate_lines(word_to_find)
+
+    # The earlier definition starters take precedence over the later ones
+    for regex, _ in definition_regexes(definition_starters, word_to_find):
+        for line_number in candidate_lines:
+            definition: Token | None = find_definition_in_line(
+                definition_index.split_text[line_number - 1],
+                line_number,
+                regex,
+                word_to_find,
             )
 
-    return default_pos
+            if definition is not None:
+                return definition
+
+    return ((0, 0), 0, "Definition")
+
+
+def get_definition(
+    full_text: str,
+    definition_starters: list[tuple[str, str]],
+    word_to_find: str,
+    definition_index: DefinitionIndex | None = None,
+) -> Token:
+    """Finds all definitions of a given word in text using language definition starters"""
+    if not word_to_find:
+        return ((0, 0), 0, "Definition")
+
+    if definition_index is None:
+        # Without an index from the server we have to build one for this request
+        definition_index = DefinitionIndex(full_text)
+
+    key: tuple[_DefinitionStarters, str] = (
+        tuple(definition_starters),
+        word_to_find,
+    )
+    if key not in definition_index.definitions:
+        definition_index.definitions[key] = find_definition(
+            definition_index, *key
+        )
+
+    return definition_index.definitions[key]
+
+
+def get_lexer_definition(
+    full_text: str,
+    language: str,
+    word_to_find: str,
+    analysis: FileAnalysis | None = None,
+) -> Token:
+    """Finds where a function or class is declared using the language's lexer instead of definition starters"""
+    if analysis is None:
+        # Without an analysis from the server we have to make one for this request
+        analysis = FileAnalysis(full_text)
+
+    return analysis.declarations(language).get(
+        word_to_find, ((0, 0), 0, "Definition")
+    )
@@ -0,0 +1,89 @@
+from functools import lru_cache
+from pathlib import Path
+from stat import S_ISREG
+
+from pyeditorconfig.pyeditorconfig import Section, glob_match, parse_file
+
+# Every .editorconfig file that applies to a path along with its modification time
+_EditorconfigFiles = tuple[tuple[Path, int], ...]
+
+
+@lru_cache(maxsize=256)
+def parse_editorconfig_cached(
+    path: Path, modified_time: int
+) -> tuple[list[Section], bool]:
+    """Parses an .editorconfig file. The modification time is part of the cache key so
+    a file is only parsed again once it has actually changed"""
+    return parse_file(path)
+
+
+@lru_cache(maxsize=1024)
+def resolve_config_cached(
+    path: Path, editorconfig_files: _EditorconfigFiles
+) -> dict[str, str]:
+    """Does the same as pyeditorconfig.get_config() with the .editorconfig files already found"""
+    # The closest files take precedence so they go last
+    all_sections: list[Section] = []
+    for editorconfig_path, modified_time in editorconfig_files:
+        sections, _ = parse_editorconfig_cached(
+            editorconfig_path, modified_time
+        )
+        all_sections[0:0] = sections
+
+    result: dict[str, str] = {}
+    for section in all_sections:
+        relative: str = (
+            "/" + path.relative_to(section.glob_relative_to).as_posix()
+        )
+
+        if section.path_glob.startswith("/"):
+            glob: str = section.path_glob
+        elif "/" in section.path_glob:
+            glob = "/" + section.path_glob
+        else:
+            glob = "**/" + section.path_glob
+
+        try:
+            if not glob_match(glob, relative):
+                continue
+        except Exception:
+            continue
+
+        for name, value in section.config.items():
+            if value == "unset":
+                result.pop(name, None)
+                continue
+
+            result[name] = value
+
+    return result
+
+
+def get_editorconfig(file_path: Path | str) -> dict[str, str]:
+    """Gets the editorconfig settings for a file while only parsing .editorconfig files that changed since the last request"""
+    path = Path(file_path)
+    assert path.is_absolute()
+
+    editorconfig_files: list[tuple[Path, int]] = []
+    for parent in path.parents:
+        editorconfig_path: Path = parent / ".editorconfig"
+
+        try:
+            stat_result = editorconfig_path.stat()
+        except OSError:
+            continue
+
+        if not S_ISREG(stat_result.st_mode):
+            continue
+
+        modified_time: int = stat_result.st_mtime_ns
+        editorconfig_files.append((editorconfig_path, modified_time))
+
+        _, is_root = parse_editorconfig_cached(
+            editorconfig_path, modified_time
+        )
+        if is_root:
+            break
+
+    # The result is cached so the caller gets a copy it can change
+    return dict(resolve_config_cached(path, tuple(editorconfig_files)))
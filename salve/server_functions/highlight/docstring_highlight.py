@@ -1,5 +1,7 @@
-from functools import cache
-from re import DOTALL, MULTILINE, Match, compile
+from bisect import bisect_left, bisect_right
+from functools import cache, lru_cache
+from itertools import accumulate
+from re import DOTALL, MULTILINE, Match, Pattern, compile
 
 from beartype.typing import Callable
 from pygments.lexer import RegexLexer, default
@@ -18,8 +20,9 @@ useful_tokens = {
 
 # Beartype speed optimizations
 _TokenType = type(StringToken)  # Resolves to pygments.token._TokenType
-_TokenTupleInternalType = tuple[_TokenType | Callable, ...]
+_TokenTupleInternalType = tuple[_TokenType | Callable | None, ...]
 _TokenTupleReturnType = list[tuple[str, _TokenType]]
+_CompiledRegexes = list[tuple[Pattern, str]]
 _ListOfStrs = list[str]
 _LexReturnTokens = list[tuple[_TokenType, str]]
 
@@ -78,100 +81,214 @@ def get_pygments_comment_regexes(lexer: RegexLexer) -> _TokenTupleReturnType:
     return list(set(regexes))  # type: ignore
 
 
-def proper_docstring_tokens(lexer: RegexLexer, full_text: str) -> list[Token]:
-    proper_highlight_regexes: _TokenTupleReturnType = (
-        get_pygments_comment_regexes(lexer)
-    )
-
-    new_docstring_tokens: list[Token] = []
-    split_text: _ListOfStrs = full_text.splitlines()
-
-    for regex, token_type in proper_highlight_regexes:
-        current_text = full_text
-        match: Match[str] | None = compile(
-            regex, flags=MULTILINE | DOTALL
-        ).search(full_text)
-
-        if match is None:
-            # Onwards to the next regex!
-            continue
+@cache
+def compiled_comment_regexes(lexer: RegexLexer) -> _CompiledRegexes:
+    """Compiles the regexes from get_pygments_comment_regexes() once per lexer along with their simple token type"""
+    compiled_regexes: _CompiledRegexes = []
 
-        start_pos: tuple[int, int] = (1, 0)
+    for regex, token_type in get_pygments_comment_regexes(lexer):
         simple_token_type: str | None = get_new_token_type(str(token_type))
         if not simple_token_type:
             continue
 
-        while match:
-            span: tuple[int, int] = match.span()
-            matched_str: str = current_text[span[0] : span[1]]
-
-            # Remove any whitespace previous to the match and update span accordingly
-            matched_len_initial: int = len(matched_str)
-            matched_str = matched_str.lstrip()
-            matched_len_lstripped: int = len(matched_str)
-            span = (
-                (span[0] + matched_len_initial - matched_len_lstripped),
-                span[1],
-            )
+        compiled_regexes.append(
+            (compile(regex, flags=MULTILINE | DOTALL), simple_token_type)
+        )
 
-            # Other useful variables without relation
-            newline_count: int = matched_str.count("\n")
-            previous_text: str = current_text[: span[0]]
+    return compiled_regexes
 
-            start_line: int = previous_text.count("\n") + start_pos[0]
 
-            # Deal with the easy case first
-            if not newline_count:
-                # Prepare token variables
-                start_col: int = split_text[start_line].find(matched_str)
-                current_text: str = full_text[span[0] + span[1] - span[0] :]
+class CommentScan:
+    """The matches of a lexer's comment regexes in a piece of text. Scanning stops at the end of the
+    lines that were asked for and picks back up from there if a later request needs more of the text"""
 
-                # Create and add token
-                token: Token = (
-                    (start_line, start_col),
-                    matched_len_lstripped,
-                    simple_token_type,
+    def __init__(self, lexer: RegexLexer, full_text: str) -> None:
+        self.full_text: str = full_text
+        self.regexes: _CompiledRegexes = compiled_comment_regexes(lexer)
+
+        # The index each line starts at with the end of the text as the last item
+        self.line_starts: list[int] = [
+            0,
+            *accumulate(map(len, full_text.splitlines(keepends=True))),
+        ]
+
+        self.matches: list[list[tuple[int, int]]] = [[] for _ in self.regexes]
+        self.scan_positions: list[int] = [0 for _ in self.regexes]
+
+        # For each regex the matches an older scan found after an edit (see CommentScan.reuse()), how far they
+        # have moved, and where that scan stopped. Once we find one of them the rest are taken without scanning
+        self.edit_end: int = 0
+        self.later_matches: list[tuple[list[tuple[int, int]], int, int]] = [
+            ([], 0, 0) for _ in self.regexes
+        ]
+
+    def scan_until(self, index: int) -> None:
+        """Finds every match that starts before the given index"""
+        for i, (regex, _) in enumerate(self.regexes):
+            position: int = self.scan_positions[i]
+
+            while position <= index:
+                match: Match[str] | None = regex.search(
+                    self.full_text, position
                 )
-                new_docstring_tokens.append(token)
 
-                start_pos = (start_line, start_col + matched_len_lstripped)
-                current_text = current_text[: span[1]]
+                if match is None:
+                    # There's nothing left to find so we never need to scan again
+                    position = len(self.full_text) + 1
+                    break
+
+                self.matches[i].append(match.span())
+                position = max(match.end(), match.start() + 1)
+
+                if match.start() >= self.edit_end and self.later_matches[i][0]:
+                    position = self.catch_up(i, match.span(), position)
+
+            self.scan_positions[i] = position
+
+    def catch_up(self, i: int, span: tuple[int, int], position: int) -> int:
+        """Takes the older scan's matches after the edit once it's clear we would find the same ones
+        (a match we found after the edit is one of them) and returns where to keep scanning from"""
+        later_matches, delta, later_position = self.later_matches[i]
+        first_later: int = bisect_left(
+            later_matches, span[0] - delta, key=lambda later: later[0]
+        )
+        if first_later >= len(later_matches):
+            # Nothing the older scan found is left to line up with
+            self.later_matches[i] = ([], 0, 0)
+            return position
+
+        self.later_matches[i] = (
+            later_matches[first_later:],
+            delta,
+            later_position,
+        )
+        if (
+            later_matches[first_later][0] + delta,
+            later_matches[first_later][1] + delta,
+        ) != span:
+            return position
+
+        # The text after the edit is the same so scanning on from here would find the same matches
+        self.matches[i] += [
+            (start + delta, end + delta)
+            for start, end in later_matches[first_later + 1 :]
+        ]
+        self.later_matches[i] = ([], 0, 0)
+        return later_position + delta
+
+    def reuse(
+        self, previous: "CommentScan", edit: tuple[int, int, int]
+    ) -> None:
+        """Takes the matches of an older scan of the same lexer where the text between the edit's start and
+        old end (which now ends at the new end) changed. Matches ending before the edit are kept so scanning picks
+        up after the last of them, and matches after it are taken once scanning reaches one of them"""
+        start, old_end, new_end = edit
+        if previous.regexes is not self.regexes or (
+            len(previous.full_text) - old_end != len(self.full_text) - new_end
+        ):
+            return
+
+        self.edit_end = new_end
+        for i, matches in enumerate(previous.matches):
+            kept_matches: list[tuple[int, int]] = matches[
+                : bisect_left(matches, start, key=lambda span: span[1])
+            ]
+            self.matches[i] = kept_matches
+            self.scan_positions[i] = (
+                max(kept_matches[-1][1], kept_matches[-1][0] + 1)
+                if kept_matches
+                else 0
+            )
+            self.later_matches[i] = (
+                matches[
+                    bisect_left(matches, old_end, key=lambda span: span[0]) :
+                ],
+                new_end - old_end,
+                previous.scan_positions[i],
+            )
 
-                # Continue onward!
-                match = compile(regex, flags=MULTILINE).search(current_text)
-                continue
 
-            # Now for multiple line matches
-            split_match: list[str] = matched_str.splitlines()
-            for i in range(newline_count + 1):
-                match_str: str = split_match[i]
-                initial_len: int = len(match_str)
-                start_col: int = initial_len - len(match_str.lstrip())
+@lru_cache(maxsize=16)
+def comment_scan_cached(lexer: RegexLexer, full_text: str) -> CommentScan:
+    return CommentScan(lexer, full_text)
 
-                if i == 0:
-                    line: str = split_text[start_line - 1]
 
-                    true_len: int = len(line)
-                    lstripped_len: int = len(line.lstrip())
-                    initial_len = lstripped_len
-                    if lstripped_len != true_len:
-                        # In case the regex doesn't skip whitespace/junk
-                        initial_len = true_len
+def proper_docstring_tokens(
+    lexer: RegexLexer,
+    full_text: str,
+    text_range: tuple[int, int] = (1, -1),
+    scan: CommentScan | None = None,
+) -> list[Token]:
+    """Gives the docstring, heredoc and multiline comment Token's in the text range. Whether a line is inside one
+    of these depends on the text before it so the text is only scanned up until the end of the text range"""
+    if scan is None:
+        scan = comment_scan_cached(lexer, full_text)
+    line_starts: list[int] = scan.line_starts
+    line_count: int = len(line_starts) - 1
+
+    first_line: int = text_range[0]
+    last_line: int = line_count if text_range[1] == -1 else text_range[1]
+    last_line = min(last_line, line_count)
+
+    if first_line > last_line:
+        return []
+
+    range_start: int = line_starts[first_line - 1]
+    range_end: int = line_starts[last_line]
+    scan.scan_until(range_end)
+
+    new_docstring_tokens: list[Token] = []
+
+    for (_, simple_token_type), matches in zip(scan.regexes, scan.matches):
+        # Matches never overlap so their ends are sorted just like their starts
+        first_match: int = bisect_right(
+            matches, range_start, key=lambda span: span[1]
+        )
+
+        for start, end in matches[first_match:]:
+            if start >= range_end:
+                break
+
+            # Remove any whitespace previous to the match
+            matched_str: str = full_text[start:end]
+            start += len(matched_str) - len(matched_str.lstrip())
+            split_match: _ListOfStrs = full_text[start:end].splitlines()
 
-                    start_col = line.find(match_str)
+            start_line: int = bisect_right(line_starts, start)
+            start_col: int = start - line_starts[start_line - 1]
 
-                # Create and add token
+            # Deal with the easy case first
+            if len(split_match) == 1:
                 token: Token = (
-                    (start_line + i, start_col),
-                    initial_len - start_col,
+                    (start_line, start_col),
+                    len(split_match[0]),
                     simple_token_type,
                 )
                 new_docstring_tokens.append(token)
+                continue
+
+            # Now for multiple line matches
+            for i, match_str in enumerate(split_match):
+                line_number: int = start_line + i
+                if not first_line <= line_number <= last_line:
+                    continue
 
-                start_pos = (start_line + i, start_col + len(match_str))
+                token_start: int = len(match_str) - len(match_str.lstrip())
+                token_len: int = len(match_str) - token_start
 
-            # Continue onward!
-            current_text = current_text[span[1] :]
-            match = compile(regex, flags=MULTILINE).search(current_text)
+                if i == 0:
+                    # The first line goes on until the end of the line
+                    line: str = full_text[
+                        line_starts[line_number - 1] : line_starts[line_number]
+                    ]
+                    token_start = start_col
+                    token_len = len(line.splitlines()[0]) - start_col
+
+                token = (
+                    (line_number, token_start),
+                    token_len,
+                    simple_token_type,
+                )
+                new_docstring_tokens.append(token)
 
     return new_docstring_tokens
@@ -1,16 +1,22 @@
-from functools import cache
+from functools import cache, lru_cache
 
 from pygments import lex
 from pygments.lexer import Lexer, RegexLexer
 from pygments.lexers import get_lexer_by_name
 from token_tools import (
     Token,
+    merge_tokens,
     normal_text_range,
     only_tokens_in_text_range,
     overwrite_and_merge_tokens,
 )
 
-from .docstring_highlight import _LexReturnTokens, proper_docstring_tokens
+from .docstring_highlight import (
+    CommentScan,
+    _LexReturnTokens,
+    comment_scan_cached,
+    proper_docstring_tokens,
+)
 from .misc import get_new_token_type
 
 
@@ -19,6 +25,71 @@ def lexer_by_name_cached(language: str) -> Lexer:
     return get_lexer_by_name(language)
 
 
+# Relative to the line lexed: (column, length, token type, pygments token type)
+_LineTokens = tuple[tuple[int, int, str, str], ...]
+
+
+def lex_line(line: str, language: str) -> _LineTokens:
+    """Lexes a single line into (column, length, token type, pygments token type) tuples. Each line is lexed
+    on its own so its tokens only depend on its text and can be reused until the line changes"""
+
+    lexer: Lexer = lexer_by_name_cached(language)
+    line_tokens: list[tuple[int, int, str, str]] = []
+    column: int = 0
+
+    og_tokens: _LexReturnTokens = list(lex(line, lexer))
+    for token in og_tokens:
+        new_type: str | None = get_new_token_type(str(token[0]))
+        token_str: str = token[1]
+        token_len: int = len(token_str)
+
+        if token_str == "\n":
+            # Lexer adds the newline back as its own token
+            continue
+
+        if not token_str.strip() or not new_type:
+            # If the token is empty or is plain Text we simply skip it because that's ultimately useless info
+            column += token_len
+            continue
+
+        line_tokens.append((column, token_len, new_type, str(token[0])))
+        column += token_len
+
+    return tuple(line_tokens)
+
+
+@lru_cache(maxsize=2**16)
+def lex_line_cached(line: str, language: str) -> _LineTokens:
+    return lex_line(line, language)
+
+
+def overwrite_tokens_by_line(
+    old_tokens: list[Token], new_tokens: list[Token]
+) -> list[Token]:
+    """Same as overwrite_and_merge_tokens but only lines with new tokens are overwritten as
+    tokens can only overlap with tokens on their own line"""
+    new_tokens_by_line: dict[int, list[Token]] = {}
+    for token in new_tokens:
+        new_tokens_by_line.setdefault(token[0][0], []).append(token)
+
+    old_tokens_by_line: dict[int, list[Token]] = {}
+    untouched_tokens: list[Token] = []
+    for token in old_tokens:
+        if token[0][0] not in new_tokens_by_line:
+            untouched_tokens.append(token)
+            continue
+
+        old_tokens_by_line.setdefault(token[0][0], []).append(token)
+
+    output_tokens: list[Token] = merge_tokens(untouched_tokens)
+    for line_number, line_tokens in new_tokens_by_line.items():
+        output_tokens += overwrite_and_merge_tokens(
+            old_tokens_by_line.get(line_number, []), line_tokens
+        )
+
+    return sorted(output_tokens)
+
+
 def get_highlights(
     full_text: str,
     language: str = "text",
@@ -26,40 +97,43 @@ def get_highlights(
 ) -> list[Token]:
     """Gets pygments tokens from text provided in language proved and converts them to Token's"""
 
-    # Create some variables used all throughout the function
     lexer: Lexer = lexer_by_name_cached(language)
-    new_tokens: list[Token] = []
-
     split_text, text_range = normal_text_range(full_text, text_range)
 
-    start_index: tuple[int, int] = (text_range[0], 0)
-
-    for line in split_text:
-        og_tokens: _LexReturnTokens = list(lex(line, lexer))
-        for token in og_tokens:
-            new_type: str | None = get_new_token_type(str(token[0]))
-            token_str: str = token[1]
-            token_len: int = len(token_str)
+    # Unchanged lines have already been lexed so this only lexes new or edited lines
+    lexed_lines: list[_LineTokens] = [
+        lex_line_cached(line, language) for line in split_text
+    ]
+    scan: CommentScan | None = (
+        comment_scan_cached(lexer, full_text)
+        if isinstance(lexer, RegexLexer)
+        else None
+    )
 
-            if token_str == "\n":
-                # Lexer adds the newline back as its own token
-                continue
+    return highlight_lexed_lines(
+        lexer, full_text, text_range, lexed_lines, scan
+    )
 
-            if not token_str.strip() or not new_type:
-                # If the token is empty or is plain Text we simply skip it because that's ultimately useless info
-                start_index = (start_index[0], start_index[1] + token_len)
-                continue
 
-            # Create and append the Token that will be returned
-            new_token = (start_index, token_len, new_type)
-            new_tokens.append(new_token)
+def highlight_lexed_lines(
+    lexer: Lexer,
+    full_text: str,
+    text_range: tuple[int, int],
+    lexed_lines: list[_LineTokens],
+    scan: CommentScan | None,
+) -> list[Token]:
+    """Turns the lexed lines of a proper text range (see normal_text_range) into Token's and
+    overwrites them with the docstring Token's from the scan"""
+    new_tokens: list[Token] = []
 
-            start_index = (start_index[0], start_index[1] + token_len)
-        start_index = (start_index[0] + 1, 0)
+    for line_number, line_tokens in enumerate(lexed_lines, text_range[0]):
+        for column, token_len, new_type, _ in line_tokens:
+            new_tokens.append(((line_number, column), token_len, new_type))
 
-    if isinstance(lexer, RegexLexer):
-        new_tokens = overwrite_and_merge_tokens(
-            new_tokens, proper_docstring_tokens(lexer, full_text)
+    if isinstance(lexer, RegexLexer) and scan is not None:
+        new_tokens = overwrite_tokens_by_line(
+            new_tokens,
+            proper_docstring_tokens(lexer, full_text, text_range, scan),
         )
 
     new_tokens = only_tokens_in_text_range(new_tokens, text_range)
@@ -1,45 +1,8 @@
-from re import Match, Pattern, compile
+from functools import lru_cache
+from re import Match, Pattern, compile, escape
 
 from token_tools import Token
 
-url_regex: Pattern = compile(r"(ftp|http|https)://[a-zA-Z0-9_-]")
-
-
-def get_urls(whole_text: str, text_range: tuple[int, int]) -> list[Token]:
-    lines: list[str] = whole_text.splitlines()
-    start_pos: tuple[int, int] = (text_range[0], 0)
-    url_toks: list[Token] = []
-    while True:
-        if start_pos[0] > text_range[1]:
-            break
-
-        line: str = lines[start_pos[0] - text_range[0]][start_pos[1] :]
-        match_start: Match[str] | None = url_regex.search(line)
-        if match_start is None:
-            start_pos = (start_pos[0] + 1, 0)
-            continue
-        token_start_col = match_start.span()[0]  # type: ignore
-        url: str = line[token_start_col:]
-
-        # Narrow down the url
-        url = url.strip()
-        url = url.split()[0]
-        url = url.split("'")[0]
-        url = url.split("`")[0]
-        url = url.split('"')[0]
-        url = url.rstrip(".,?!")
-        if "(" not in url:  # urls can contain spaces (e.g. wikipedia)
-            url = url.rstrip(")")
-        url = url.rstrip(".,?!")
-
-        url_len: int = len(url)
-        token: Token = ((start_pos[0], token_start_col), url_len, "Link")
-        url_toks.append(token)
-        start_pos = (start_pos[0], start_pos[1] + url_len + token_start_col)
-
-    return url_toks
-
-
 hidden_chars: dict[str, str] = {
     "\u00a0": "NO-BREAK SPACE",
     "\u00ad": "SOFT HYPHEN",
@@ -96,29 +59,79 @@ hidden_chars: dict[str, str] = {
     "\ue0020": "TAG SPACE",
 }
 
+url_regex: Pattern = compile(r"(ftp|http|https)://[a-zA-Z0-9_-]")
+
+# Finds either the start of a url or any single hidden char in one pass
+special_token_regex: Pattern = compile(
+    url_regex.pattern
+    + "|["
+    + "".join(escape(char) for char in hidden_chars if len(char) == 1)
+    + "]"
+)
+
+# Relative to the line scanned: (column, length, token type)
+_LineTokens = tuple[tuple[int, int, str], ...]
 
-def find_hidden_chars(
-    whole_text: str, text_range: tuple[int, int]
-) -> list[Token]:
-    lines: list[str] = whole_text.splitlines()
-    hidden_char_indexes: list[tuple[tuple[int, int], str]] = [
-        ((line_index + text_range[0], char_index), char)
-        for line_index, line in enumerate(lines)
-        for char_index, char in enumerate(line)
-        if char in list(hidden_chars.keys())
-    ]
-    tok_list: list[Token] = [
-        (char[0], len(char[1]), "Hidden_Char") for char in hidden_char_indexes
-    ]
-    return tok_list
+
+def url_length(url_start: str) -> int:
+    """Takes the text starting at a url and gives the length of the url"""
+    url: str = url_start
+
+    # Narrow down the url
+    url = url.strip()
+    url = url.split()[0]
+    url = url.split("'")[0]
+    url = url.split("`")[0]
+    url = url.split('"')[0]
+    url = url.rstrip(".,?!")
+    if "(" not in url:  # urls can contain spaces (e.g. wikipedia)
+        url = url.rstrip(")")
+    url = url.rstrip(".,?!")
+
+    return len(url)
+
+
+@lru_cache(maxsize=2**16)
+def special_tokens_in_line(line: str) -> _LineTokens:
+    """Finds the links and hidden chars of a single line. The result only depends on the line's text
+    so lines that haven't changed since they were last scanned cost nothing"""
+    line_tokens: list[tuple[int, int, str]] = []
+    url_end: int = 0
+
+    match: Match[str]
+    for match in special_token_regex.finditer(line):
+        start: int = match.start()
+
+        if match.group() in hidden_chars:
+            line_tokens.append((start, 1, "Hidden_Char"))
+            continue
+
+        if start < url_end:
+            # This is just part of the previous url
+            continue
+
+        url_len: int = url_length(line[start:])
+        line_tokens.append((start, url_len, "Link"))
+        url_end = start + url_len
+
+    return tuple(line_tokens)
 
 
 def get_special_tokens(
     whole_text: str, text_range: tuple[int, int]
 ) -> list[Token]:
+    lines: list[str] = whole_text.splitlines()
     return_tokens: list[Token] = []
-    return_tokens.extend(get_urls(whole_text, text_range))
-    if [char for char in hidden_chars if char in whole_text]:
-        # If there are no hidden chars we don't want to needlessly compute this
-        return_tokens.extend(find_hidden_chars(whole_text, text_range))
+
+    for line_number in range(text_range[0], text_range[1] + 1):
+        if line_number > len(lines):
+            break
+
+        for column, token_len, token_type in special_tokens_in_line(
+            lines[line_number - 1]
+        ):
+            return_tokens.append(
+                ((line_number, column), token_len, token_type)
+            )
+
     return return_tokens
@@ -1,6 +1,15 @@
 from functools import cache
+from itertools import chain
+from re import Match, Pattern, compile
 from unicodedata import category
 
+from beartype.typing import Iterator
+
+# Every line break str.splitlines() splits on so line ranges match the split text used everywhere else
+LINE_BREAKS: Pattern = compile(
+    "\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]"
+)
+
 
 @cache
 def is_unicode_letter(char: str) -> bool:
@@ -8,25 +17,41 @@ def is_unicode_letter(char: str) -> bool:
     return char == "_" or category(char).startswith("L")
 
 
-def find_words(full_text: str) -> list[str]:
-    """Returns a list of all words in a given piece of text"""
-    words_list = []
-    current_word = ""
+class _LetterTable(dict[int, int]):
+    """A str.translate() table that keeps letters and turns everything else into spaces. Chars are
+    only looked up the first time they are seen so after that the whole translation happens in C"""
 
-    for char in full_text:
-        if is_unicode_letter(char):
-            current_word += char
-            continue
+    def __missing__(self, code: int) -> int:
+        self[code] = code if is_unicode_letter(chr(code)) else ord(" ")
+        return self[code]
 
-        word_is_empty: bool = not current_word
-        if word_is_empty:
-            continue
 
-        words_list.append(current_word)
-        current_word = ""
+LETTER_TABLE: _LetterTable = _LetterTable()
 
-    word_left = bool(current_word)
-    if word_left:
-        words_list.append(current_word)
 
-    return words_list
+def find_words(full_text: str) -> list[str]:
+    """Returns a list of all words in a given piece of text"""
+    return full_text.translate(LETTER_TABLE).split()
+
+
+def iter_words(
+    full_text: str, text_range: tuple[int, int] = (1, -1)
+) -> Iterator[str]:
+    """Gives the words of the lines in text_range (inclusive, -1 being the last line) one line
+    at a time so only one line is ever split and nothing past the range is looked at"""
+    line_start: int = 0
+    line_breaks: Iterator[Match[str] | None] = chain(
+        LINE_BREAKS.finditer(full_text), (None,)
+    )
+
+    for line_number, line_break in enumerate(line_breaks, 1):
+        line_end: int = (
+            len(full_text) if line_break is None else line_break.start()
+        )
+        if line_number >= text_range[0]:
+            yield from find_words(full_text[line_start:line_end])
+
+        if line_break is None or line_number == text_range[1]:
+            return
+
+        line_start = line_break.end()
@@ -1,37 +1,85 @@
-from difflib import get_close_matches
+from collections import Counter
+from difflib import SequenceMatcher
+from heapq import nsmallest
 
-from .misc import find_words
+from .word_index import WordIndex, workspace_counts
+
+
+def find_close_matches(
+    word: str, words_by_length: dict[int, set[str]], cutoff: float = 0.6
+) -> list[str]:
+    """Gives the same words as difflib.get_close_matches() (unsorted) but skips every word length that could never reach the cutoff"""
+    matcher = SequenceMatcher()
+    matcher.set_seq2(word)
+    close_matches: list[str] = []
+
+    for length, words in words_by_length.items():
+        # This is what SequenceMatcher.real_quick_ratio() would give for every word of this length
+        if 2.0 * min(length, len(word)) / (length + len(word)) < cutoff:
+            continue
+
+        for other_word in words:
+            matcher.set_seq1(other_word)
+            if matcher.quick_ratio() >= cutoff and matcher.ratio() >= cutoff:
+                close_matches.append(other_word)
+
+    return close_matches
 
 
 def get_replacements(
-    full_text: str, expected_keywords: list[str], replaceable_word: str
+    full_text: str,
+    expected_keywords: list[str],
+    replaceable_word: str,
+    word_index: WordIndex | None = None,
+    max_results: int | None = None,
+    workspace_index: WordIndex | None = None,
 ) -> list[str]:
-    """Returns a list of possible and plausible replacements for a given word"""
-    # Get all words in file
-    starter_words: list[str] = find_words(full_text)
-    starter_words.extend(
-        expected_keywords * 3
-    )  # We add a multiplier of three to boost the score of keywords
-    while replaceable_word in starter_words:
-        starter_words.remove(replaceable_word)
-
-    # Get close matches
-    starters_no_duplicates = set(starter_words)
-    similar_words = get_close_matches(
-        replaceable_word,
-        starters_no_duplicates,
-        n=len(starters_no_duplicates),
-        cutoff=0.6,
-    )
+    """Returns a list of possible and plausible replacements for a given word
+    (from the words of every other file too if given a workspace_index)"""
 
-    # Reintroduce duplicates
-    similar_with_duplicates = [
-        word for word in starter_words if word in similar_words
-    ]
+    if word_index is None:
+        # Without an index from the server we have to build one for this request
+        word_index = WordIndex(full_text)
 
-    ranked_matches = sorted(
-        set(similar_with_duplicates),
-        key=(lambda s: (-similar_with_duplicates.count(s), len(s), s)),
+    # Get close matches in the file or workspace (these stay the same until a file changes)
+    searched_index: WordIndex = workspace_index or word_index
+    if replaceable_word not in searched_index.close_matches:
+        searched_index.close_matches[replaceable_word] = find_close_matches(
+            replaceable_word, searched_index.words_by_length
+        )
+
+    close_words: list[str] = [
+        word
+        for word in searched_index.close_matches[replaceable_word]
+        if word != replaceable_word
+    ]
+    word_scores: Counter[str] = Counter(
+        dict(
+            zip(
+                close_words,
+                workspace_counts(close_words, word_index, workspace_index),
+            )
+        )
     )
 
+    # Get close matches in the keywords
+    keyword_counts: Counter[str] = Counter(expected_keywords)
+    keywords_by_length: dict[int, set[str]] = {}
+    for keyword in keyword_counts:
+        if keyword != replaceable_word:
+            keywords_by_length.setdefault(len(keyword), set()).add(keyword)
+
+    for keyword in find_close_matches(replaceable_word, keywords_by_length):
+        # We add a multiplier of three to boost the score of keywords
+        word_scores[keyword] += keyword_counts[keyword] * 3
+
+    def rank(s: str) -> tuple[int, int, str]:
+        return (-word_scores[s], len(s), s)
+
+    if max_results is not None:
+        # Only the best few are wanted so we don't need to sort everything
+        return nsmallest(max_results, word_scores, key=rank)
+
+    ranked_matches = sorted(word_scores, key=rank)
+
     return ranked_matches
@@ -0,0 +1,108 @@
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import chain
+from operator import add
+
+from .misc import find_words
+
+
+class WordIndex:
+    """A word frequency index of a piece of text that can be searched by prefix without rescanning the text"""
+
+    def __init__(
+        self, full_text: str = "", line_words: list[list[str]] | None = None
+    ) -> None:
+        # The words of each line can be given if they were already found (see FileAnalysis)
+        self.word_counts: Counter[str] = (
+            Counter(find_words(full_text))
+            if line_words is None
+            else Counter(chain.from_iterable(line_words))
+        )
+        self.sorted_words: list[str] = sorted(self.word_counts)
+
+        self.words_by_length: dict[int, set[str]] = {}
+        for word in self.word_counts:
+            self.words_by_length.setdefault(len(word), set()).add(word)
+
+        # Replacements already found for words in this version of the text
+        self.close_matches: dict[str, list[str]] = {}
+
+    def count(self, word: str) -> int:
+        """Returns the number of times a word shows up in the indexed text"""
+        return self.word_counts[word]
+
+    def words_with_prefix(self, prefix: str) -> list[str]:
+        """Returns every unique word in the index that starts with the prefix given (in sorted order)"""
+        # Words sharing a prefix are always next to each other in a sorted list. No word can have the last
+        # unicode character in it (it's not a letter) so every word with the prefix is sorted before prefix + it
+        return self.sorted_words[
+            bisect_left(self.sorted_words, prefix) : bisect_left(
+                self.sorted_words, prefix + chr(0x10FFFF)
+            )
+        ]
+
+    def add_counts(self, word_counts: Counter[str]) -> None:
+        """Adds words to the index (with how many times each one shows up)"""
+        self.close_matches = {}
+
+        new_words: list[str] = [
+            word for word in word_counts if word not in self.word_counts
+        ]
+        self.word_counts.update(word_counts)
+
+        for word in new_words:
+            self.words_by_length.setdefault(len(word), set()).add(word)
+
+        if len(new_words) > 32:
+            # Adding a whole file is faster as one sort than as many insertions
+            self.sorted_words = sorted(self.word_counts)
+            return
+
+        for word in new_words:
+            insort(self.sorted_words, word)
+
+    def remove_counts(self, word_counts: Counter[str]) -> None:
+        """Takes words out of the index (with how many times each one shows up)"""
+        self.close_matches = {}
+        self.word_counts.subtract(word_counts)
+
+        removed_words: list[str] = [
+            word for word in word_counts if self.word_counts[word] <= 0
+        ]
+        for word in removed_words:
+            del self.word_counts[word]
+            self.words_by_length[len(word)].discard(word)
+
+        if len(removed_words) > 32:
+            self.sorted_words = [
+                word for word in self.sorted_words if word in self.word_counts
+            ]
+            return
+
+        for word in removed_words:
+            self.sorted_words.pop(bisect_left(self.sorted_words, word))
+
+    def update(self, removed_text: str, added_text: str) -> None:
+        """Updates the index after removed_text was replaced by added_text in the indexed text"""
+        self.remove_counts(Counter(find_words(removed_text)))
+        self.add_counts(Counter(find_words(added_text)))
+
+
+def workspace_counts(
+    words: list[str], word_index: WordIndex, workspace_index: WordIndex | None
+) -> list[int]:
+    """Returns how many times each word shows up in the file, or in the workspace when given a workspace_index.
+    The file's own words count twice in the workspace as they're the most likely to be wanted"""
+    file_counts: list[int] = list(
+        map(word_index.word_counts.__getitem__, words)
+    )
+    if workspace_index is None:
+        return file_counts
+
+    return list(
+        map(
+            add,
+            map(workspace_index.word_counts.__getitem__, words),
+            file_counts,
+        )
+    )
@@ -0,0 +1,111 @@
+from array import array
+
+from token_tools import GENERIC_TOKENS, Token
+
+# Every token type the server can give so each one can be sent as its index instead of its name
+TOKEN_TYPES: list[str] = [*GENERIC_TOKENS, "Link", "Hidden_Char", "Definition"]
+TOKEN_TYPE_IDS: dict[str, int] = {
+    token_type: type_id for type_id, token_type in enumerate(TOKEN_TYPES)
+}
+
+
+def encode_tokens(tokens: list[Token]) -> array:
+    """Packs Token's into a flat array of (line delta, column, length, type id) where the column is relative
+    to the previous Token's column if they are on the same line. Much smaller to send than the Token's themselves"""
+    values: list[int] = []
+    previous_line: int = 0
+    previous_column: int = 0
+
+    for (line, column), length, token_type in sorted(tokens):
+        if token_type not in TOKEN_TYPE_IDS:
+            raise Exception(
+                f"Token type {token_type} can't be encoded, types are {TOKEN_TYPES}!"
+            )
+
+        if line != previous_line:
+            previous_column = 0
+
+        values += (
+            line - previous_line,
+            column - previous_column,
+            length,
+            TOKEN_TYPE_IDS[token_type],
+        )
+        previous_line, previous_column = line, column
+
+    # Deltas are usually small so we use the smallest item size they all fit in
+    largest_value: int = max(values, default=0)
+    for typecode in ("B", "H", "I", "Q"):
+        if largest_value < 2 ** (8 * array(typecode).itemsize):
+            return array(typecode, values)
+
+    raise Exception(f"Token value {largest_value} is too large to encode!")
+
+
+def shift_tokens(
+    tokens: list[Token], shift: tuple[int, int, int]
+) -> list[Token]:
+    """Moves Token's to where their lines are after an edit given as (first changed line, first line after the
+    change in the old version, lines added) by dropping the ones on changed lines and moving the ones below"""
+    start_line, end_line, line_delta = shift
+    return [
+        ((line + line_delta, column), length, token_type)
+        if line >= end_line
+        else ((line, column), length, token_type)
+        for (line, column), length, token_type in tokens
+        if not start_line <= line < end_line
+    ]
+
+
+def diff_tokens(
+    old_tokens: list[Token],
+    new_tokens: list[Token],
+    shift: tuple[int, int, int] = (0, 0, 0),
+) -> tuple[list[Token], list[Token]]:
+    """Returns the Token's that were added and removed to go from the old Token's (moved by shift_tokens())
+    to the new ones"""
+    old_set: set[Token] = set(shift_tokens(old_tokens, shift))
+    new_set: set[Token] = set(new_tokens)
+
+    return (sorted(new_set - old_set), sorted(old_set - new_set))
+
+
+def apply_token_diff(tokens: list[Token], diff: dict) -> list[Token]:
+    """Applies a HIGHLIGHT diff result to the Token's from the response it was based on (compact or not)"""
+    added: list[Token] | array = diff["added"]
+    removed: list[Token] | array = diff["removed"]
+    if isinstance(added, array):
+        added, removed = decode_tokens(added), decode_tokens(removed)  # type: ignore
+
+    if not diff["base"]:
+        # The server didn't have the base anymore so it sent every Token
+        return list(added)  # type: ignore
+
+    removed_set: set[Token] = set(removed)  # type: ignore
+    return sorted(
+        [
+            token
+            for token in shift_tokens(tokens, diff["shift"])
+            if token not in removed_set
+        ]
+        + added  # type: ignore
+    )
+
+
+def decode_tokens(encoded: array) -> list[Token]:
+    """Turns the output of encode_tokens() back into Token's"""
+    tokens: list[Token] = []
+    line: int = 0
+    column: int = 0
+
+    for line_delta, column_delta, length, type_id in zip(
+        encoded[0::4], encoded[1::4], encoded[2::4], encoded[3::4]
+    ):
+        if line_delta:
+            line += line_delta
+            column = 0
+
+        column += column_delta
+        tokens.append(((line, column), length, TOKEN_TYPES[type_id]))
+
+    return tokens
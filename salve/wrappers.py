@@ -1,64 +1,205 @@
+from array import array
+
 from collegamento import FileServer, Request
-from pyeditorconfig import get_config
 from token_tools import Token, normal_text_range
 
+from .misc import stream_ranges
+from .server import SalveServer
 from .server_functions import (
+    changed_lines,
     find_autocompletions,
     get_definition,
-    get_highlights,
+    get_editorconfig,
+    get_lexer_definition,
     get_replacements,
     get_special_tokens,
 )
+from .token_encoding import diff_tokens, encode_tokens
 
 
 def find_autocompletions_request_wrapper(
-    server: FileServer, request: Request
+    server: SalveServer, request: Request
 ) -> list[str]:
     return find_autocompletions(
         full_text=request["file"],  # type: ignore
         expected_keywords=request["expected_keywords"],  # type: ignore
         current_word=request["current_word"],  # type: ignore
+        word_index=server.get_word_index(request["file_name"]),  # type: ignore
+        workspace_index=(
+            server.get_workspace_index() if request.get("workspace") else None
+        ),
+        max_results=request.get("max_results"),  # type: ignore
     )
 
 
 def get_replacements_request_wrapper(
-    server: FileServer, request: Request
+    server: SalveServer, request: Request
 ) -> list[str]:
     return get_replacements(
         full_text=request["file"],  # type: ignore
         expected_keywords=request["expected_keywords"],  # type: ignore
         replaceable_word=request["current_word"],  # type: ignore
+        word_index=server.get_word_index(request["file_name"]),  # type: ignore
+        workspace_index=(
+            server.get_workspace_index() if request.get("workspace") else None
+        ),
+        max_results=request.get("max_results"),  # type: ignore
     )
 
 
 def get_highlights_request_wrapper(
-    server: FileServer, request: Request
-) -> list[Token]:
-    return get_highlights(
-        full_text=request["file"],  # type: ignore
-        language=request["language"],  # type: ignore
-        text_range=request["text_range"],  # type: ignore
+    server: SalveServer, request: Request
+) -> list[Token] | array | dict | list[list[Token] | array | None]:
+    if request.get("stream"):
+        return stream_highlights(server, request)
+
+    if request.get("batch") is not None:
+        batch_tokens: list[list[Token] | None] = server.get_batch_highlights(
+            request["batch"]  # type: ignore
+        )
+        if not request.get("compact"):
+            return batch_tokens
+
+        return [
+            None if tokens is None else encode_tokens(tokens)
+            for tokens in batch_tokens
+        ]
+
+    # The analysis is shared with the other commands so lines already lexed for this version aren't lexed again
+    tokens: list[Token] = server.get_highlights(
+        request["file_name"],  # type: ignore
+        request["language"],  # type: ignore
+        request["text_range"],  # type: ignore
     )
 
+    if not request.get("diff"):
+        return encode_tokens(tokens) if request.get("compact") else tokens
+
+    # We can only give a diff if the client has the last result we gave for this file
+    file: str = request["file_name"]  # type: ignore
+    full_text: str = request["file"]  # type: ignore
+    base_id, base_text, base_tokens = server.highlight_results.get(
+        file, (0, "", [])
+    )
+    if base_id != request["diff_base"]:  # type: ignore
+        base_id, base_tokens = 0, []
+
+    # Lines added or removed move every Token below them so those are moved first instead of sent again
+    shift: tuple[int, int, int] = (
+        changed_lines(base_text, full_text) if base_id else (0, 0, 0)
+    )
+    server.highlight_results[file] = (request["id"], full_text, tokens)
+    added, removed = diff_tokens(base_tokens, tokens, shift)
+
+    if request.get("compact"):
+        return {
+            "base": base_id,
+            "shift": shift,
+            "added": encode_tokens(added),
+            "removed": encode_tokens(removed),
+        }
+
+    return {
+        "base": base_id,
+        "shift": shift,
+        "added": added,
+        "removed": removed,
+    }
+
+
+def stream_chunk(
+    lines: list[tuple[int, int]],
+    tokens: list[Token],
+    done: bool,
+    compact: bool,
+) -> dict:
+    return {
+        "lines": lines,
+        "tokens": encode_tokens(tokens) if compact else tokens,
+        "done": done,
+    }
+
+
+def stream_highlights(server: SalveServer, request: Request) -> dict:
+    """Sends the Token's of each chunk of the range as its own partial response as soon as it's highlighted
+    (the visible range first) and returns the last chunk. Stops early if a newer request replaces it
+    """
+    file: str = request["file_name"]  # type: ignore
+    language: str = request["language"]  # type: ignore
+    compact: bool = request.get("compact", False)  # type: ignore
+    text_range: tuple[int, int] = server.proper_text_range(
+        file,
+        request["text_range"],  # type: ignore
+    )
+    chunk_ranges: list[tuple[int, int]] = stream_ranges(
+        text_range,
+        request.get("visible_range"),  # type: ignore
+        request["chunk_size"],  # type: ignore
+    )
+
+    all_tokens: list[Token] = []
+    for chunk_range in chunk_ranges[:-1]:
+        tokens: list[Token] = server.get_highlights(
+            file, language, chunk_range
+        )
+        all_tokens += tokens
+        server.response_queue.put(
+            {
+                "id": request["id"],
+                "type": "response",
+                "cancelled": False,
+                "command": request["command"],
+                "partial": True,
+                "result": stream_chunk([chunk_range], tokens, False, compact),
+            }
+        )
+
+        if server.stream_superseded(request):
+            return stream_chunk([], [], True, compact)
+
+    tokens = server.get_highlights(file, language, chunk_ranges[-1])
+    if text_range == server.proper_text_range(file, (1, -1)):
+        # Every chunk together is the whole file so it can be saved like any other whole file highlight
+        server.save_full_highlights(file, language, all_tokens + tokens)
+
+    return stream_chunk([chunk_ranges[-1]], tokens, True, compact)
+
 
 def editorconfig_request_wrapper(server: FileServer, request: Request) -> dict:
-    return get_config(request["file_path"])  # type: ignore
+    return get_editorconfig(request["file_path"])  # type: ignore
 
 
 def get_definition_request_wrapper(
-    server: FileServer, request: Request
+    server: SalveServer, request: Request
 ) -> Token:
+    if request["definition_starters"] is None:  # type: ignore
+        return get_lexer_definition(
+            request["file"],  # type: ignore
+            request["language"],  # type: ignore
+            request["current_word"],  # type: ignore
+            server.get_declarations(
+                request["file_name"],  # type: ignore
+                request["language"],  # type: ignore
+            ),
+        )
+
     return get_definition(
         request["file"],  # type: ignore
         request["definition_starters"],  # type: ignore
         request["current_word"],  # type: ignore
+        server.get_definition_index(request["file_name"]),  # type: ignore
     )
 
 
 def get_special_tokens_request_wrapper(
     server: FileServer, request: Request
-) -> list[Token]:
-    return get_special_tokens(
+) -> list[Token] | array:
+    tokens: list[Token] = get_special_tokens(
         request["file"],  # type: ignore
         normal_text_range(request["file"], request["text_range"])[1],  # type: ignore
     )
+
+    if request.get("compact"):
+        return encode_tokens(tokens)
+
+    return tokens
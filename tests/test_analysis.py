@@ -0,0 +1,74 @@
+from salve.misc import apply_edit, edit_indexes
+from salve.server_functions import (
+    DefinitionIndex,
+    FileAnalysis,
+    WordIndex,
+    get_highlights,
+)
+from salve.server_functions.highlight.docstring_highlight import CommentScan
+from salve.server_functions.highlight.highlight import lexer_by_name_cached
+
+
+def test_file_analysis():
+    text: str = open("tests/testing_file1.py").read()
+    analysis = FileAnalysis(text)
+
+    assert analysis.highlights("python") == get_highlights(text, "python")
+    assert analysis.highlights("python", (3, 8)) == get_highlights(
+        text, "python", (3, 8)
+    )
+
+    line_words: list[list[str]] = analysis.all_line_words()
+    assert (
+        WordIndex(text, line_words).word_counts == WordIndex(text).word_counts
+    )
+    assert (
+        DefinitionIndex(text, line_words).word_lines
+        == DefinitionIndex(text).word_lines
+    )
+
+    # Lines the edit didn't touch are reused from the last version
+    new_text: str = apply_edit(text, (1, 0), (1, 0), "new_word = 1\n")
+    new_analysis = FileAnalysis(new_text, analysis)
+    new_line_words: list[list[str]] = new_analysis.all_line_words()
+    assert new_line_words[0] == ["new_word"]
+    assert new_line_words[1] is line_words[0]
+    assert new_analysis.highlights("python") == get_highlights(
+        new_text, "python"
+    )
+
+    # Lexed lines are carried over by their text without going through a global cache
+    assert (
+        new_analysis.lexed_lines["python"][1]
+        is (analysis.lexed_lines["python"][0])
+    )
+    assert len(new_analysis.lexed_by_text["python"]) == len(
+        set(text.splitlines()) | set(new_text.splitlines())
+    )
+
+
+def test_comment_scan_reuse():
+    text: str = "".join(
+        f'def function_{i}():\n    """Docstring {i}"""\n' for i in range(50)
+    )
+    analysis = FileAnalysis(text)
+    assert analysis.highlights("python", (99, 100))[-1] == (
+        (100, 4),
+        18,
+        "String",
+    )
+
+    # The docstrings before the edit are kept and the ones after it are moved instead of being found again
+    start, end = edit_indexes(text, (3, 0), (3, 0))
+    new_text: str = text[:start] + "x = 1\n" + text[end:]
+    new_analysis = FileAnalysis(new_text, analysis, (start, end, start + 6))
+    lexer = lexer_by_name_cached("python")
+    scan = new_analysis.comment_scan(lexer)
+    assert max(scan.scan_positions) > 0
+
+    assert new_analysis.highlights("python", (100, 101)) == FileAnalysis(
+        new_text
+    ).highlights("python", (100, 101))
+    fresh_scan = CommentScan(lexer, new_text)
+    fresh_scan.scan_until(len(new_text))
+    assert scan.matches == fresh_scan.matches
@@ -0,0 +1,69 @@
+from asyncio import gather, run, wait_for
+from time import sleep
+
+from pytest import raises
+
+from salve import AUTOCOMPLETE, HIGHLIGHT, IPC, REPLACEMENTS, Response
+
+
+def test_request_async():
+    context = IPC()
+    context.update_file("test", "this thing that\ntest\n")
+
+    async def make_requests() -> tuple[Response, Response]:
+        return await wait_for(
+            gather(
+                context.request_async(
+                    AUTOCOMPLETE, file="test", current_word="th"
+                ),
+                context.request_async(
+                    REPLACEMENTS, file="test", current_word="thin"
+                ),
+            ),
+            timeout=10,
+        )
+
+    autocomplete_output, replacements_output = run(make_requests())
+    assert autocomplete_output["result"] == ["that", "this", "thing"]
+    assert replacements_output["result"] == ["this", "thing"]
+
+    # A new event loop takes over from the closed one
+    highlight_output: Response = run(
+        wait_for(
+            context.request_async(HIGHLIGHT, file="test", language="text"),
+            timeout=10,
+        )
+    )
+    assert highlight_output["command"] == HIGHLIGHT
+    assert highlight_output["cancelled"] is False
+
+    # Responses given to requests made with request_async() aren't given again
+    assert context.get_response(AUTOCOMPLETE) is None
+
+    # A streamed request gives more than one response so it can't be awaited
+    with raises(Exception):
+        run(context.request_async(HIGHLIGHT, file="test", stream=True))
+
+    context.kill_IPC()
+
+
+def test_callbacks():
+    context = IPC()
+    context.update_file("test", "this thing that\ntest\n")
+
+    responses: list[Response] = []
+    old_id: int = context.request(AUTOCOMPLETE, file="test", current_word="t")
+    new_id: int = context.request(AUTOCOMPLETE, file="test", current_word="th")
+    context.add_callback(old_id, responses.append)
+    context.add_callback(new_id, responses.append)
+    sleep(1)
+
+    # Without an event loop callbacks are called when responses get checked
+    assert context.get_response(AUTOCOMPLETE) is None
+    assert [response["id"] for response in responses] == [old_id, new_id]
+
+    # The older request was replaced by the newer one so it was cancelled
+    assert responses[0]["cancelled"]
+    assert responses[1]["result"] == ["that", "this", "thing"]
+
+    context.kill_IPC()
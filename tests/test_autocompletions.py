@@ -0,0 +1,73 @@
+from pathlib import Path
+
+from salve.server_functions import (
+    WordIndex,
+    find_autocompletions,
+    find_words,
+    iter_words,
+)
+
+
+def test_find_autocompletions():
+    file = open(Path("tests/testing_file1.py"), "r+").read()
+    word_index = WordIndex(file)
+
+    assert word_index.words_with_prefix("t") == ["test", "this", "type"]
+    assert word_index.count("noqa") == 2
+
+    assert find_autocompletions(file, [], "t", word_index) == [
+        "test",
+        "this",
+        "type",
+    ]
+    assert find_autocompletions(file, [], "t") == ["test", "this", "type"]
+    assert find_autocompletions(file, [], "t", word_index, max_results=2) == [
+        "test",
+        "this",
+    ]
+
+    # Keywords are only used when nothing in the file matches
+    assert find_autocompletions(file, ["zip", "zap", "zip"], "z") == [
+        "zip",
+        "zap",
+    ]
+    assert find_autocompletions(file, ["typing"], "ty") == ["type"]
+
+
+def test_workspace_autocompletions():
+    word_index = WordIndex("total = tomato\n")
+    workspace_index = WordIndex()
+    workspace_index.add_counts(word_index.word_counts)
+    workspace_index.add_counts(
+        WordIndex("tomorrow tomorrow tomorrow").word_counts
+    )
+
+    assert find_autocompletions("", [], "to", word_index) == [
+        "total",
+        "tomato",
+    ]
+
+    # The file's own words count twice so they can still beat words used often in other files
+    assert find_autocompletions("", [], "to", word_index, workspace_index) == [
+        "tomorrow",
+        "total",
+        "tomato",
+    ]
+
+    workspace_index.remove_counts(WordIndex("tomorrow").word_counts)
+    assert find_autocompletions("", [], "to", word_index, workspace_index) == [
+        "total",
+        "tomato",
+        "tomorrow",
+    ]
+
+
+def test_find_words():
+    text = "naïve_x2 ²b 中文\r\nℕat Ⅻ\n\nlast_word"
+
+    assert find_words(text) == ["naïve_x", "b", "中文", "ℕat", "last_word"]
+    assert find_words("foo(bar_baz)") == ["foo", "bar_baz"]
+    assert list(iter_words(text)) == find_words(text)
+    assert list(iter_words(text, (2, 3))) == ["ℕat"]
+    assert list(iter_words(text, (4, -1))) == ["last_word"]
+    assert list(iter_words(text, (5, -1))) == []
@@ -0,0 +1,37 @@
+from os import environ
+from subprocess import run
+from sys import executable
+
+# Passing a tuple where a list is expected only raises when beartype is checking the call
+CHECK_SCRIPT = """
+from salve import BEARTYPE_ENABLED
+from salve.server_functions import find_autocompletions
+
+try:
+    find_autocompletions("foo", ("bar",), "f")
+except Exception:
+    print(BEARTYPE_ENABLED, "checked")
+else:
+    print(BEARTYPE_ENABLED, "unchecked")
+"""
+
+
+def run_check_script(disable_beartype: str | None) -> str:
+    env: dict[str, str] = dict(environ)
+    env.pop("SALVE_DISABLE_BEARTYPE", None)
+    if disable_beartype is not None:
+        env["SALVE_DISABLE_BEARTYPE"] = disable_beartype
+
+    return run(
+        [executable, "-c", CHECK_SCRIPT],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+
+
+def test_beartype_toggle():
+    assert run_check_script(None) == "True checked"
+    assert run_check_script("0") == "True checked"
+    assert run_check_script("1") == "False unchecked"
@@ -0,0 +1,122 @@
+from time import perf_counter, sleep
+
+from collegamento import FileClient
+
+from salve import AUTOCOMPLETE, DEFINITION, HIGHLIGHT, IPC, Response
+
+
+def test_coalescing():
+    context = IPC()
+    context.update_file("first", "foo = 1\n")
+    context.update_file("second", "longer_name = 2\n")
+
+    responses: dict[int, Response] = {}
+    first_ids: list[int] = []
+    second_ids: list[int] = []
+    for _ in range(20):
+        for file, ids in (("first", first_ids), ("second", second_ids)):
+            id: int = context.request(HIGHLIGHT, file=file, language="python")
+            context.add_callback(
+                id, lambda res: responses.update({res["id"]: res})
+            )
+            ids.append(id)
+
+    sleep(1)
+    context.get_response(HIGHLIGHT)
+
+    # Every request gets a response but only the newest one for each file gets a result
+    assert sorted(responses) == sorted(first_ids + second_ids)
+    assert not responses[first_ids[-1]]["cancelled"]
+    assert not responses[second_ids[-1]]["cancelled"]
+    assert (
+        responses[first_ids[-1]]["result"]
+        != responses[second_ids[-1]]["result"]
+    )
+    assert sum(not res["cancelled"] for res in responses.values()) <= 4
+
+    context.kill_IPC()
+
+
+def test_stale_version_cancelled():
+    context = IPC()
+    context.update_file("test", "foo = 1\n")
+    context.edit_file("test", (1, 6), (1, 7), "2")
+
+    # Requests made for an older version of the file are cancelled
+    responses: dict[int, Response] = {}
+    FileClient.request(
+        context, HIGHLIGHT, file="test", language="python", version=1
+    )
+    stale_id: int = context.current_ids[HIGHLIGHT]  # type: ignore
+    new_id: int = context.request(AUTOCOMPLETE, file="test", current_word="f")
+    for id in (stale_id, new_id):
+        context.add_callback(
+            id, lambda res: responses.update({res["id"]: res})
+        )
+    sleep(1)
+    context.get_response(HIGHLIGHT)
+
+    assert responses[stale_id]["cancelled"]
+    assert not responses[new_id]["cancelled"]
+
+    context.kill_IPC()
+
+
+def test_get_response_newest_file():
+    context = IPC()
+    context.update_file("first", "foo = 1\nfoobar = 2\n")
+    context.update_file("second", "fizz = 1\nfizzbuzz = 2\n")
+
+    # Both requests get answered but get_response() gives the one for the newest request
+    context.request(AUTOCOMPLETE, file="first", current_word="f")
+    context.request(AUTOCOMPLETE, file="second", current_word="f")
+    sleep(1)
+    output: Response | None = context.get_response(AUTOCOMPLETE)  # type: ignore
+
+    assert output is not None
+    assert output["result"] == ["fizz", "fizzbuzz"]
+
+    context.kill_IPC()
+
+
+def test_replaced_waiting_request_cancelled():
+    # The highlight runs in the main server so the definitions have to wait for it
+    context = IPC(workers={})
+    context.update_file(
+        "big",
+        "".join(
+            f'def function_{i}(argument):\n    """Docstring {i}"""\n    return argument + {i}\n'
+            for i in range(3000)
+        ),
+    )
+    context.update_file("small", "foo = 1\nfoo\n")
+
+    responses: dict[int, Response] = {}
+    context.request(HIGHLIGHT, file="big", language="python", priority=10)
+    old_id: int = context.request(
+        DEFINITION,
+        file="small",
+        current_word="foo",
+        definition_starters=[("", "before")],
+    )
+    context.add_callback(old_id, lambda res: responses.update({old_id: res}))
+
+    # The first definition is taken by the server before the second one replaces it
+    sleep(0.2)
+    new_id: int = context.request(
+        DEFINITION,
+        file="small",
+        current_word="foo",
+        definition_starters=[("", "before")],
+    )
+    context.add_callback(new_id, lambda res: responses.update({new_id: res}))
+
+    start: float = perf_counter()
+    while len(responses) < 2 and perf_counter() - start < 30:
+        context.get_response(DEFINITION)
+        sleep(0.01)
+
+    assert responses[old_id]["cancelled"]
+    assert not responses[new_id]["cancelled"]
+
+    context.kill_IPC()
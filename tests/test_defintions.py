@@ -1,6 +1,12 @@
 from pathlib import Path
+from time import sleep
 
-from salve.server_functions import get_definition
+from salve import DEFINITION, HIGHLIGHT, IPC
+from salve.server_functions import (
+    DefinitionIndex,
+    get_definition,
+    get_lexer_definition,
+)
 
 
 def test_get_definition():
@@ -48,3 +54,94 @@ def test_get_definition():
         [("", "before")],
         "test",
     ) == ((8, 0), 4, "Definition")
+
+    # Empty words used to make the search loop forever
+    assert get_definition(file, [("", "before")], "") == (
+        (0, 0),
+        0,
+        "Definition",
+    )
+
+
+def test_definition_index():
+    file = open(Path("tests/testing_file2.py"), "r+").read()
+    definition_index = DefinitionIndex(file)
+
+    assert definition_index.candidate_lines("test") == [8, 11]
+    assert definition_index.candidate_lines("x") == [5]
+    assert definition_index.candidate_lines("x5") == list(range(1, 12))
+
+    assert get_definition(
+        file, [(r"class ", "after")], "test", definition_index
+    ) == ((11, 6), 4, "Definition")
+    assert definition_index.definitions == {
+        (((r"class ", "after"),), "test"): ((11, 6), 4, "Definition")
+    }
+
+
+def test_lexer_definitions():
+    text: str = '''def foo():
+    """
+    def bar():
+    """
+    return "class Baz:"
+
+class Baz:
+    def bar(self):
+        pass
+
+def foo():
+    pass
+'''
+
+    # Only the first real declaration counts (not the ones in strings)
+    assert get_lexer_definition(text, "python", "foo") == (
+        (1, 4),
+        3,
+        "Definition",
+    )
+    assert get_lexer_definition(text, "python", "Baz") == (
+        (7, 6),
+        3,
+        "Definition",
+    )
+    assert get_lexer_definition(text, "python", "bar") == (
+        (8, 8),
+        3,
+        "Definition",
+    )
+    assert get_lexer_definition(text, "python", "missing") == (
+        (0, 0),
+        0,
+        "Definition",
+    )
+
+
+def test_lexer_definition_request():
+    context = IPC()
+    context.update_file("test", "x = 'def foo():'\n\ndef foo():\n    pass\n")
+
+    # Lexer definitions go to the HIGHLIGHT worker so they use the same lexed lines
+    servers: list = []
+    send_request = context.send_request
+    context.send_request = lambda server, command, **kwargs: (  # type: ignore
+        servers.append(server) or send_request(server, command, **kwargs)
+    )
+
+    context.request(
+        DEFINITION,
+        file="test",
+        current_word="foo",
+        language="python",
+        definition_starters=None,
+    )
+    sleep(1)
+
+    assert context.get_response(DEFINITION)["result"] == (  # type: ignore
+        (3, 4),
+        3,
+        "Definition",
+    )
+    assert servers == [(HIGHLIGHT, 0)]
+
+    context.kill_IPC()
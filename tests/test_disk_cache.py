@@ -0,0 +1,114 @@
+from os import utime
+from time import sleep
+
+from salve import DEFINITION, HIGHLIGHT, IPC, Response, decode_tokens
+from salve.disk_cache import DiskCache
+from salve.server import SAVE_DELAY
+from salve.server_functions import FileAnalysis
+
+
+def test_disk_cache(tmp_path):
+    cache = DiskCache(tmp_path)
+    analysis = FileAnalysis("class Foo:\n    pass\n")
+    tokens = analysis.highlights("python")
+
+    assert cache.load_tokens(analysis.content_hash(), "python") is None
+    cache.save_tokens(analysis.content_hash(), "python", tokens)
+    saved_tokens = cache.load_tokens(analysis.content_hash(), "python")
+    if saved_tokens is None:
+        raise AssertionError("Saved tokens weren't loaded")
+    assert decode_tokens(saved_tokens) == sorted(tokens)
+
+    cache.save_value(analysis.content_hash(), "words", {"Foo": 1})
+    assert cache.load_value(analysis.content_hash(), "words") == {"Foo": 1}
+    assert cache.load_value(analysis.content_hash(), "words", "c") is None
+
+    # Files with the same contents share results no matter their name
+    assert FileAnalysis("class Foo:\n    pass\n").content_hash() == (
+        analysis.content_hash()
+    )
+
+    # Broken files are ignored
+    cache.path(analysis.content_hash(), "words", "").write_bytes(b"")
+    assert cache.load_value(analysis.content_hash(), "words") is None
+
+    # Files are deleted by when they were last used rather than when they were saved
+    cache = DiskCache(tmp_path, max_files=1)
+    cache.save_value("first", "words", {"first": 1})
+    cache.save_value("second", "words", {"second": 1})
+    utime(cache.path("first", "words", ""), (0, 0))
+    utime(cache.path("second", "words", ""), (1, 1))
+    assert cache.load_value("first", "words") == {"first": 1}
+    cache.remove_old_files()
+    assert cache.load_value("first", "words") == {"first": 1}
+    assert cache.load_value("second", "words") is None
+
+
+def test_restart_with_disk_cache(tmp_path):
+    contents = "".join(
+        f'def function_{i}(argument):\n    """Docstring {i}"""\n    return {i}\n'
+        for i in range(300)
+    )
+
+    def request(context: IPC, command, **kwargs) -> Response:
+        context.request(command, file="test", language="python", **kwargs)
+        sleep(1)
+        output: Response | None = context.get_response(command)  # type: ignore
+        if output is None:
+            raise AssertionError(f"{command} output is None")
+        return output
+
+    context = IPC(cache_dir=tmp_path)
+    context.update_file("test", contents)
+    full_tokens = request(context, HIGHLIGHT)["result"]
+    definition = request(
+        context,
+        DEFINITION,
+        current_word="function_9",
+        definition_starters=None,
+    )["result"]
+
+    # Nothing is saved while the file could still be changing but closing it saves everything
+    assert not any(tmp_path.rglob("*-tokens-python"))
+    context.remove_file("test")
+    sleep(0.5)
+    context.kill_IPC()
+
+    assert any(tmp_path.rglob("*-tokens-python"))
+    assert any(tmp_path.rglob("*-declarations-python"))
+
+    # A new IPC loads the whole file's Token's and gives any range of them without highlighting again
+    context = IPC(cache_dir=tmp_path)
+    context.update_file("test", contents)
+    assert request(context, HIGHLIGHT, text_range=(4, 6))["result"] == [
+        token
+        for token in full_tokens  # type: ignore
+        if 4 <= token[0][0] <= 6
+    ]
+    assert request(context, HIGHLIGHT)["result"] == full_tokens
+    assert (
+        request(
+            context,
+            DEFINITION,
+            current_word="function_9",
+            definition_starters=None,
+        )["result"]
+        == definition
+    )
+    context.kill_IPC()
+
+
+def test_save_settled_files(tmp_path):
+    context = IPC(workers={}, cache_dir=tmp_path)
+    context.update_file("test", "foo = 1\n")
+    for column in range(3):
+        context.edit_file("test", (1, column), (1, column), "f")
+        context.request(HIGHLIGHT, file="test", language="python")
+        sleep(0.1)
+
+    # Only the version that stopped changing gets saved once the server is idle
+    assert not any(tmp_path.rglob("*-tokens-python"))
+    sleep(SAVE_DELAY + 0.5)
+    assert len(list(tmp_path.rglob("*-tokens-python"))) == 1
+
+    context.kill_IPC()
@@ -0,0 +1,29 @@
+from os import utime
+from pathlib import Path
+
+from pyeditorconfig import get_config
+
+from salve.server_functions import get_editorconfig
+from salve.server_functions.editorconfig import parse_editorconfig_cached
+
+
+def test_get_editorconfig(tmp_path: Path):
+    file = Path(__file__).absolute()
+    assert get_editorconfig(file) == get_config(file)
+
+    editorconfig = tmp_path / ".editorconfig"
+    editorconfig.write_text("root = true\n\n[*.py]\nindent_size = 4\n")
+    file = tmp_path / "foo.py"
+
+    assert get_editorconfig(file) == {"indent_size": "4"}
+
+    # Asking again shouldn't parse the file again
+    misses: int = parse_editorconfig_cached.cache_info().misses
+    assert get_editorconfig(tmp_path / "bar.py") == {"indent_size": "4"}
+    assert parse_editorconfig_cached.cache_info().misses == misses
+
+    # But changing it should
+    editorconfig.write_text("root = true\n\n[*.py]\nindent_size = 2\n")
+    modified_time: int = editorconfig.stat().st_mtime_ns + 1_000_000_000
+    utime(editorconfig, ns=(modified_time, modified_time))
+    assert get_editorconfig(file) == {"indent_size": "2"}
@@ -0,0 +1,109 @@
+from time import sleep
+
+from pytest import raises
+
+from salve import AUTOCOMPLETE, IPC, REPLACEMENTS, Response
+from salve.misc import apply_edit
+from salve.server_functions import WordIndex
+
+
+def test_apply_edit():
+    text = "foo bar\nbaz\nqux\n"
+
+    assert apply_edit(text, (1, 4), (1, 7), "spam") == "foo spam\nbaz\nqux\n"
+    assert apply_edit(text, (1, 7), (3, 0), "") == "foo barqux\n"
+    assert apply_edit(text, (4, 0), (4, 0), "end") == text + "end"
+    assert apply_edit(text, (2, 0), (2, 0), "new\n") == (
+        "foo bar\nnew\nbaz\nqux\n"
+    )
+
+    with raises(Exception):
+        apply_edit(text, (1, 8), (1, 8), "too far")
+
+
+def test_word_index_update():
+    old_text = "foo bar\nbaz foo\nqux\n"
+    new_text = apply_edit(old_text, (1, 4), (2, 3), "fob\nbar")
+
+    word_index = WordIndex(old_text)
+    word_index.update("foo bar\nbaz foo", "foo fob\nbar foo")
+    new_word_index = WordIndex(new_text)
+
+    assert word_index.word_counts == new_word_index.word_counts
+    assert word_index.sorted_words == new_word_index.sorted_words
+    assert word_index.words_by_length == new_word_index.words_by_length
+
+
+def test_edit_file():
+    context = IPC()
+
+    context.update_file("test", "foo\nbar\n")
+    context.request(
+        AUTOCOMPLETE,
+        file="test",
+        expected_keywords=[],
+        current_word="fo",
+    )
+    sleep(1)
+
+    output: Response | None = context.get_response(AUTOCOMPLETE)  # type: ignore
+    if output is None:
+        raise AssertionError("Autocomplete output is None")
+    assert output["result"] == ["foo"]  # type: ignore
+
+    # The server should update its copy of the file and the word index it already made
+    assert context.edit_file("test", (2, 0), (2, 3), "food") == 2
+    assert context.edit_file("test", (3, 0), (3, 0), "fool\n") == 3
+    assert context.files["test"] == "foo\nfood\nfool\n"
+
+    context.request(
+        AUTOCOMPLETE,
+        file="test",
+        expected_keywords=[],
+        current_word="fo",
+    )
+    sleep(1)
+
+    output = context.get_response(AUTOCOMPLETE)  # type: ignore
+    if output is None:
+        raise AssertionError("Autocomplete output is None")
+    assert output["result"] == ["foo", "food", "fool"]  # type: ignore
+
+    context.kill_IPC()
+
+
+def test_workspace_requests():
+    context = IPC()
+
+    context.update_file("main", "import helpers\n")
+    context.update_file("helpers", "def parse_header():\n    pass\n")
+    context.update_file("other", "parse_header()\n")
+
+    def request(command, word, workspace=True, max_results=None):
+        context.request(
+            command,
+            file="main",
+            expected_keywords=[],
+            current_word=word,
+            workspace=workspace,
+            max_results=max_results,
+        )
+        sleep(1)
+        output: Response | None = context.get_response(command)  # type: ignore
+        if output is None:
+            raise AssertionError(f"{command} output is None")
+        return output["result"]  # type: ignore
+
+    assert request(AUTOCOMPLETE, "par", workspace=False) == []
+    assert request(AUTOCOMPLETE, "par") == ["parse_header"]
+    assert request(REPLACEMENTS, "parse_heder") == ["parse_header"]
+
+    # Edits and removals have to reach the workspace index too
+    context.edit_file("helpers", (1, 4), (1, 16), "parse_footer")
+    assert request(AUTOCOMPLETE, "par") == ["parse_footer", "parse_header"]
+    context.remove_file("other")
+    context.update_file("main", "import helpers\nparse_\n")
+    assert request(AUTOCOMPLETE, "par") == ["parse_", "parse_footer"]
+    assert request(AUTOCOMPLETE, "par", max_results=1) == ["parse_"]
+
+    context.kill_IPC()
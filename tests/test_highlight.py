@@ -0,0 +1,180 @@
+from pathlib import Path
+from time import sleep
+
+from token_tools import Token, overwrite_and_merge_tokens
+
+from salve import HIGHLIGHT, IPC, Response, decode_tokens
+from salve.server_functions import get_highlights
+from salve.server_functions.highlight.docstring_highlight import (
+    proper_docstring_tokens,
+)
+from salve.server_functions.highlight.highlight import (
+    lex_line_cached,
+    lexer_by_name_cached,
+    overwrite_tokens_by_line,
+)
+
+
+def test_get_highlights_reuses_lines():
+    file = open(Path("tests/testing_file1.py"), "r+").read()
+    tokens = get_highlights(file, "python", (1, 4))
+    assert tokens[:4] == [
+        ((1, 0), 4, "Keyword"),
+        ((1, 5), 4, "Identifier"),
+        ((1, 10), 6, "Keyword"),
+        ((1, 17), 1, "Identifier"),
+    ]
+
+    # Editing one line should only lex that line again
+    misses: int = lex_line_cached.cache_info().misses
+    edited_file = file.replace("Bar: type = int", "Baz: type = int")
+    edited_tokens = get_highlights(edited_file, "python", (1, 4))
+    assert lex_line_cached.cache_info().misses == misses + 1
+    assert edited_tokens == tokens
+
+
+def test_docstring_tokens_in_text_range():
+    file = open(Path("tests/testing_file1.py"), "r+").read()
+    lexer = lexer_by_name_cached("python")
+
+    all_tokens = proper_docstring_tokens(lexer, file)
+    assert all_tokens == [
+        ((10, 4), 3, "String"),
+        ((11, 4), 4, "String"),
+        ((12, 4), 3, "String"),
+        ((20, 0), 3, "String"),
+        ((21, 0), 4, "String"),
+        ((22, 0), 3, "String"),
+    ]
+
+    # Starting inside of the docstring should still find it
+    assert proper_docstring_tokens(lexer, file, (11, 18)) == all_tokens[1:3]
+    assert proper_docstring_tokens(lexer, file, (1, 9)) == []
+
+
+def test_overwrite_tokens_by_line():
+    file = open(Path("tests/testing_file1.py"), "r+").read()
+    lexer = lexer_by_name_cached("python")
+
+    # Only overwriting the lines with new tokens gives the same result as overwriting every line
+    old_tokens: list[Token] = [
+        ((line_number, column), length, token_type)
+        for line_number, line in enumerate(file.splitlines(), 1)
+        for column, length, token_type, _ in lex_line_cached(line, "python")
+    ]
+    cases: list[tuple[list[Token], list[Token]]] = [
+        (old_tokens, proper_docstring_tokens(lexer, file)),
+        (old_tokens, []),
+        ([], proper_docstring_tokens(lexer, file)),
+        (
+            [((1, 0), 4, "Keyword"), ((1, 4), 3, "Name"), ((2, 2), 5, "Name")],
+            [((1, 2), 4, "String"), ((3, 0), 1, "String")],
+        ),
+    ]
+    for old, new in cases:
+        assert overwrite_tokens_by_line(old, new) == sorted(
+            overwrite_and_merge_tokens(old, new)
+        )
+
+
+def test_batch_highlights():
+    context = IPC()
+    file = open(Path("tests/testing_file1.py"), "r+").read()
+    context.update_file("first", file)
+    context.update_file("second", "int main() {\n    return 0;\n}\n")
+
+    def request(**kwargs):
+        context.request(HIGHLIGHT, **kwargs)
+        sleep(1)
+        output: Response | None = context.get_response(HIGHLIGHT)  # type: ignore
+        if output is None:
+            raise AssertionError("Highlight output is None")
+        return output["result"]  # type: ignore
+
+    batch = [
+        ("first", "python", (1, 4)),
+        ("second", "c", (1, -1)),
+        ("first", "python", (3, 8)),
+        ("first", "python", (20, 100)),
+    ]
+    results = request(batch=batch)
+
+    # Every range gives what it would have given on its own even when it overlaps with another
+    assert len(results) == len(batch)
+    for (file_name, language, text_range), tokens in zip(batch, results):
+        assert tokens == sorted(
+            request(file=file_name, language=language, text_range=text_range)
+        )
+
+    compact_results = request(batch=batch[:2], compact=True)
+    assert [decode_tokens(tokens) for tokens in compact_results] == results[:2]
+
+    context.kill_IPC()
+
+
+def test_stream_highlights():
+    context = IPC()
+    context.update_file(
+        "test",
+        "".join(
+            f'def function_{i}(argument):\n    """Docstring {i}"""\n    return {i}\n'
+            for i in range(100)
+        ),
+    )
+
+    context.request(HIGHLIGHT, file="test", language="python")
+    sleep(1)
+    output: Response | None = context.get_response(HIGHLIGHT)  # type: ignore
+    if output is None:
+        raise AssertionError("Highlight output is None")
+    all_tokens = output["result"]  # type: ignore
+
+    # Callbacks get every chunk as it comes in with the visible range first
+    chunks: list[dict] = []
+    context.add_callback(
+        context.request(
+            HIGHLIGHT,
+            file="test",
+            language="python",
+            stream=True,
+            chunk_size=50,
+            visible_range=(120, 130),
+        ),
+        lambda response: chunks.append(response["result"]),  # type: ignore
+    )
+    sleep(2)
+    context.get_response(HIGHLIGHT)
+
+    assert [chunk["lines"] for chunk in chunks] == [
+        [(120, 130)],
+        [(131, 180)],
+        [(70, 119)],
+        [(181, 230)],
+        [(20, 69)],
+        [(231, 280)],
+        [(1, 19)],
+        [(281, 300)],
+    ]
+    assert [chunk["done"] for chunk in chunks] == [False] * 7 + [True]
+    assert sorted(
+        token for chunk in chunks for token in chunk["tokens"]
+    ) == sorted(all_tokens)
+
+    # Chunks that haven't been taken yet are given together by get_response()
+    context.request(
+        HIGHLIGHT,
+        file="test",
+        language="python",
+        stream=True,
+        chunk_size=100,
+        compact=True,
+    )
+    sleep(2)
+    output = context.get_response(HIGHLIGHT)  # type: ignore
+    if output is None:
+        raise AssertionError("Highlight output is None")
+    assert output["result"]["lines"] == [(1, 100), (101, 200), (201, 300)]  # type: ignore
+    assert output["result"]["done"]  # type: ignore
+    assert decode_tokens(output["result"]["tokens"]) == sorted(all_tokens)  # type: ignore
+
+    context.kill_IPC()
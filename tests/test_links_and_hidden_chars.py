@@ -0,0 +1,24 @@
+from salve.server_functions import get_special_tokens
+
+
+def test_get_special_tokens():
+    file = "\n".join(
+        [
+            "# See https://www.google.com or http://example.com.",
+            "nothing to see here",
+            "x = '​'  # ftp://files.example.com/(a)",
+        ]
+    )
+
+    assert get_special_tokens(file, (1, 3)) == [
+        ((1, 6), 22, "Link"),
+        ((1, 32), 18, "Link"),
+        ((3, 5), 1, "Hidden_Char"),
+        ((3, 11), 27, "Link"),
+    ]
+
+    # Lines outside of the text range aren't scanned
+    assert get_special_tokens(file, (2, 3)) == [
+        ((3, 5), 1, "Hidden_Char"),
+        ((3, 11), 27, "Link"),
+    ]
@@ -0,0 +1,52 @@
+from time import sleep
+
+from salve import AUTOCOMPLETE, HIGHLIGHT, IPC, REPLACEMENTS, Response
+
+
+def test_priorities_and_deadlines():
+    # Everything runs on the main server so the requests have to wait for each other
+    context = IPC(workers={})
+    context.update_file(
+        "big",
+        "".join(f"variable_{i} = {i}\n" for i in range(8000)),
+    )
+    context.update_file("small", "this thing that\ntest\n")
+
+    responses: list[Response] = []
+
+    # Keeps the server busy while the other requests come in
+    context.add_callback(
+        context.request(HIGHLIGHT, file="big", language="python"),
+        responses.append,
+    )
+    sleep(0.1)
+
+    replacements_id: int = context.request(
+        REPLACEMENTS, file="small", current_word="thin"
+    )
+    highlight_id: int = context.request(
+        HIGHLIGHT, file="small", language="python", priority=5
+    )
+    autocomplete_id: int = context.request(
+        AUTOCOMPLETE, file="small", current_word="th", deadline=0.0
+    )
+    for id in (replacements_id, highlight_id, autocomplete_id):
+        context.add_callback(id, responses.append)
+
+    for _ in range(100):
+        context.get_response(HIGHLIGHT)
+        if len(responses) == 4:
+            break
+        sleep(0.1)
+
+    # The autocomplete had a higher default priority than the replacements but its deadline passed while it waited
+    assert [response["id"] for response in responses[1:]] == [
+        highlight_id,
+        autocomplete_id,
+        replacements_id,
+    ]
+    assert not responses[1]["cancelled"]
+    assert responses[2]["cancelled"]
+    assert not responses[3]["cancelled"]
+
+    context.kill_IPC()
@@ -0,0 +1,21 @@
+from pathlib import Path
+
+from salve.server_functions import WordIndex, get_replacements
+
+
+def test_get_replacements():
+    file = open(Path("tests/testing_file1.py"), "r+").read()
+    word_index = WordIndex(file)
+
+    assert get_replacements(file, [], "thid", word_index) == ["this"]
+    assert get_replacements(file, [], "thid") == ["this"]
+    assert word_index.close_matches == {"thid": ["this"]}
+
+    # Keywords get a boost over words in the file
+    assert get_replacements(file, ["thin", "thin"], "thid", word_index) == [
+        "thin",
+        "this",
+    ]
+    assert get_replacements(
+        file, ["thin"], "thid", word_index, max_results=1
+    ) == ["thin"]
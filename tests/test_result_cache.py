@@ -0,0 +1,101 @@
+from sys import getsizeof
+from time import perf_counter, sleep
+
+from salve import HIGHLIGHT, IPC, LINKS_AND_CHARS, Response
+from salve.result_cache import MISSING, ResultCache, estimate_size
+
+
+def test_result_cache():
+    cache = ResultCache(max_entries=2)
+    first = ResultCache.request_key(
+        {
+            "id": 1,
+            "type": "request",
+            "command": HIGHLIGHT,
+            "file": "contents",
+            "file_name": "test",
+            "version": 1,
+            "text_range": (1, -1),
+            "expected_keywords": ["a", "b"],
+        }
+    )
+    if first is None:
+        raise AssertionError("Request with a version has no key")
+
+    # Request ids and priorities don't change the result but versions do
+    assert first == ResultCache.request_key(
+        {
+            "id": 2,
+            "type": "request",
+            "command": HIGHLIGHT,
+            "file": "contents",
+            "file_name": "test",
+            "version": 1,
+            "text_range": (1, -1),
+            "expected_keywords": ["a", "b"],
+            "priority": 5,
+        }
+    )
+    assert ResultCache.request_key({"file_name": "test"}) is None
+
+    second = ("test", (("version", 2),))
+    third = ("other", (("version", 1),))
+
+    assert cache.get(first) is MISSING
+    cache.add(first, [1])
+    cache.add(second, [2])
+    assert cache.get(first) == [1]
+
+    # The least recently used result goes first
+    cache.add(third, [3])
+    assert cache.get(second) is MISSING
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    cache.forget_file("test")
+    assert list(cache.results) == [third]
+
+    # Results too big for the cache are never kept
+    cache.max_bytes = 100
+    cache.add(first, list(range(100)))
+    assert cache.get(first) is MISSING
+    assert cache.total_bytes <= 100
+
+    # The position tuple inside each Token is counted too
+    token: tuple = ((1, 0), 4, "Keyword")
+    assert estimate_size([token] * 10) >= getsizeof([token] * 10) + 10 * (
+        getsizeof(token) + getsizeof(token[0])
+    )
+
+
+def test_repeated_requests():
+    context = IPC()
+    context.update_file(
+        "test",
+        "".join(f"def function_{i}(): return {i}\n" for i in range(1000)),
+    )
+
+    def request(command) -> tuple[Response, float]:
+        start: float = perf_counter()
+        context.request(command, file="test", language="python")
+        while (output := context.get_response(command)) is None:
+            sleep(0.001)
+        return output, perf_counter() - start
+
+    first, first_time = request(HIGHLIGHT)
+    second, second_time = request(HIGHLIGHT)
+    assert first["result"] == second["result"]  # type: ignore
+    assert second_time < first_time
+
+    # The IPC counts the results every server gave from its cache
+    assert (context.cache_hits, context.cache_misses) == (1, 1)
+
+    first, _ = request(LINKS_AND_CHARS)
+    assert first["result"] == request(LINKS_AND_CHARS)[0]["result"]  # type: ignore
+
+    # The cached results can't be given once the file changes
+    context.edit_file("test", (1, 0), (1, 0), "class Changed: pass\n")
+    third, _ = request(HIGHLIGHT)
+    assert third["result"] != second["result"]  # type: ignore
+    assert ((1, 0), 5, "Keyword") in third["result"]  # type: ignore
+
+    context.kill_IPC()
@@ -0,0 +1,99 @@
+from time import sleep
+
+from salve import (
+    HIGHLIGHT,
+    IPC,
+    LINKS_AND_CHARS,
+    Response,
+    apply_token_diff,
+    decode_tokens,
+)
+from salve.server_functions import get_highlights, get_special_tokens
+from salve.token_encoding import encode_tokens
+
+
+def test_encoding_round_trip():
+    text: str = open("tests/testing_file1.py").read()
+    tokens = get_highlights(text, "python")
+    encoded = encode_tokens(tokens)
+
+    assert decode_tokens(encoded) == tokens
+    assert len(encoded) == 4 * len(tokens)
+    assert decode_tokens(encode_tokens([])) == []
+
+    # Big values still fit
+    assert decode_tokens(encode_tokens([((70000, 3), 300, "String")])) == [
+        ((70000, 3), 300, "String")
+    ]
+
+
+def test_compact_requests():
+    context = IPC()
+    text: str = "https://www.google.com  (​)\nx = 1\n"
+    context.update_file("test", text)
+
+    context.request(HIGHLIGHT, file="test", language="python", compact=True)
+    context.request(LINKS_AND_CHARS, file="test", compact=True)
+    sleep(1)
+
+    assert decode_tokens(
+        context.get_response(HIGHLIGHT)["result"]  # type: ignore
+    ) == get_highlights(text, "python")
+    assert decode_tokens(
+        context.get_response(LINKS_AND_CHARS)["result"]  # type: ignore
+    ) == get_special_tokens(text, (1, 2))
+
+    context.kill_IPC()
+
+
+def test_highlight_diffs():
+    context = IPC()
+    context.update_file("test", "x = 1\ny = 'two'\n")
+
+    def highlight(diff_base: int, compact: bool = False) -> Response:
+        context.request(
+            HIGHLIGHT,
+            file="test",
+            language="python",
+            diff=True,
+            diff_base=diff_base,
+            compact=compact,
+        )
+        sleep(1)
+        return context.get_response(HIGHLIGHT)  # type: ignore
+
+    # Without a base we get every Token
+    first: Response = highlight(0)
+    assert first["result"]["base"] == 0
+    tokens = apply_token_diff([], first["result"])
+    assert tokens == get_highlights(context.files["test"], "python")
+
+    # Only the changed line gets sent the next time
+    context.edit_file("test", (2, 4), (2, 9), "2.5")
+    second: Response = highlight(first["id"])
+    assert second["result"]["base"] == first["id"]
+    assert {token[0][0] for token in second["result"]["added"]} == {2}
+    # Token's on changed lines are dropped by the shift so they aren't sent as removed
+    assert second["result"]["shift"] == (2, 3, 0)
+    assert second["result"]["removed"] == []
+    tokens = apply_token_diff(tokens, second["result"])
+    assert tokens == get_highlights(context.files["test"], "python")
+
+    # Adding a line moves the Token's below it instead of sending them again
+    context.edit_file("test", (1, 0), (1, 0), "z = 0\n")
+    shifted: Response = highlight(second["id"])
+    assert shifted["result"]["shift"] == (1, 1, 1)
+    assert {token[0][0] for token in shifted["result"]["added"]} == {1}
+    assert shifted["result"]["removed"] == []
+    tokens = apply_token_diff(tokens, shifted["result"])
+    assert tokens == get_highlights(context.files["test"], "python")
+
+    # A base the server doesn't have anymore gives every Token again
+    context.edit_file("test", (1, 0), (1, 1), "xyz")
+    third: Response = highlight(first["id"], compact=True)
+    assert third["result"]["base"] == 0
+    assert apply_token_diff(tokens, third["result"]) == get_highlights(
+        context.files["test"], "python"
+    )
+
+    context.kill_IPC()
@@ -0,0 +1,142 @@
+from time import perf_counter, sleep
+
+from pytest import raises
+
+from salve import (
+    AUTOCOMPLETE,
+    EDITORCONFIG,
+    HIGHLIGHT,
+    IPC,
+    PROCESS,
+    REPLACEMENTS,
+    THREAD,
+    Response,
+)
+
+
+def test_slow_command_does_not_block():
+    context = IPC()
+    context.update_file(
+        "big",
+        "".join(
+            f'def function_{i}(argument):\n    """Docstring {i}"""\n    return argument + {i}\n'
+            for i in range(3000)
+        ),
+    )
+
+    finish_times: dict[str, float] = {}
+
+    def record(response: Response) -> None:
+        finish_times[response["command"]] = perf_counter()
+
+    context.add_callback(
+        context.request(HIGHLIGHT, file="big", language="python"), record
+    )
+    context.add_callback(
+        context.request(AUTOCOMPLETE, file="big", current_word="func"), record
+    )
+
+    start: float = perf_counter()
+    while len(finish_times) < 2 and perf_counter() - start < 60:
+        context.get_response(AUTOCOMPLETE)
+        sleep(0.01)
+
+    # The highlight runs in its own process so the autocomplete doesn't wait for it
+    assert finish_times[AUTOCOMPLETE] < finish_times[HIGHLIGHT]
+
+    context.kill_IPC()
+
+
+def test_worker_types():
+    context = IPC(
+        workers={
+            AUTOCOMPLETE: (PROCESS, 1),
+            REPLACEMENTS: (PROCESS, 2),
+            EDITORCONFIG: (THREAD, 1),
+        }
+    )
+    context.update_file("test", "this thing that\ntest\n")
+    context.edit_file("test", (2, 0), (2, 4), "thin")
+
+    responses: dict[str, Response] = {}
+    for command, word in ((AUTOCOMPLETE, "th"), (REPLACEMENTS, "thinn")):
+        context.add_callback(
+            context.request(command, file="test", current_word=word),
+            lambda response: responses.update({response["command"]: response}),
+        )
+    context.add_callback(
+        context.request(EDITORCONFIG, file_path=__file__),
+        lambda response: responses.update({response["command"]: response}),
+    )
+    sleep(1)
+    context.get_response(AUTOCOMPLETE)
+
+    assert responses[AUTOCOMPLETE]["result"] == [
+        "that",
+        "thin",
+        "this",
+        "thing",
+    ]
+    assert responses[REPLACEMENTS]["result"] == ["thin", "this", "thing"]
+    assert isinstance(responses[EDITORCONFIG]["result"], dict)
+
+    context.kill_IPC()
+
+    with raises(Exception):
+        IPC(workers={HIGHLIGHT: ("fiber", 1)})
+
+    with raises(Exception):
+        IPC(workers={EDITORCONFIG: (THREAD, 0)})
+
+    # Commands that use the server's indexes can't share them between threads
+    with raises(Exception):
+        IPC(workers={AUTOCOMPLETE: (THREAD, 1)})
+
+
+def test_highlight_processes():
+    context = IPC(workers={HIGHLIGHT: (PROCESS, 2)})
+    files: list[str] = ["first", "second", "third"]
+    for file in files:
+        context.update_file(file, f"{file} = 'string'\n")
+
+    # Threads highlighting at the same time as an edit share the analyses through the lock
+    responses: dict[str, Response] = {}
+    for file in files:
+        context.add_callback(
+            context.request(HIGHLIGHT, file=file, language="python"),
+            lambda response, file=file: responses.update({file: response}),
+        )
+    context.edit_file("third", (1, 0), (1, 5), "x")
+    context.add_callback(
+        context.request(HIGHLIGHT, file="third", language="python"),
+        lambda response: responses.update({"third": response}),
+    )
+
+    start: float = perf_counter()
+    while len(responses) < 3 and perf_counter() - start < 30:
+        context.get_response(HIGHLIGHT)
+        sleep(0.01)
+    sleep(0.5)
+    context.get_response(HIGHLIGHT)
+
+    assert responses["first"]["result"][0] == ((1, 0), 5, "Identifier")
+    assert responses["second"]["result"][0] == ((1, 0), 6, "Identifier")
+    assert responses["third"]["result"][0] == ((1, 0), 1, "Identifier")
+
+    context.kill_IPC()
+
+
+def test_thread_error_printed(capfd):
+    context = IPC(workers={EDITORCONFIG: (THREAD, 1)})
+
+    # A request that fails in a thread is cancelled and its traceback still shows up
+    responses: dict[int, Response] = {}
+    id: int = context.send_request(None, EDITORCONFIG, file_path=12)
+    context.add_callback(id, lambda response: responses.update({id: response}))
+    sleep(1)
+    context.get_response(EDITORCONFIG)
+
+    assert responses[id]["cancelled"]
+    assert "Traceback" in capfd.readouterr().err
+
+    context.kill_IPC()